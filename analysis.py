@@ -0,0 +1,192 @@
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import sys
+
+import bitboard
+import records
+import search
+from bitboard import BLACK, RED
+from position import Position
+
+# Batch position analysis: search many positions across a process pool and report the best move,
+# score and number of legal moves of each, in input order.
+#
+# Positions are given as Position objects or as text. The text form follows the GameLogic.board
+# layout: the eight rows board[0] to board[7], separated by '/', each with one character per column
+# x = 0..7, then the side to move ('b' or 'r'):
+#     b black man, B black king, r red man, R red king, '.' empty, '-' light square (or '.')
+# For example the opening position is
+#     -b-b-b-b/b-b-b-b-/-b-b-b-b/.-.-.-.-/-.-.-.-./r-r-r-r-/-r-r-r-r/r-r-r-r- b
+# PDN FEN strings ("B:W21,22:B1,2") are accepted too.
+#
+# Input is read and sent to the workers in chunks, and only a bounded number of chunks is in flight
+# at once, so any number of positions can be streamed through in constant memory.
+
+CHUNK_SIZE = 64
+DEFAULT_TIME_LIMIT = 0.1
+# Transposition table size of each worker; kept small, as each worker holds its own
+TABLE_MB = 4
+
+_PIECES = {'b': (BLACK, False), 'B': (BLACK, True), 'r': (RED, False), 'R': (RED, True)}
+_SIDES = {'b': BLACK, 'r': RED}
+
+# best_move is in PDN notation, score is from the side to move's point of view in search units,
+# and error is set instead of the rest when the position could not be read
+Analysis = collections.namedtuple('Analysis', ['position', 'best_move', 'score', 'legal_moves', 'depth', 'nodes',
+                                               'error'])
+
+
+class PositionFormatError(ValueError):
+    pass
+
+
+def board_text(position):
+    rows = []
+    for y in range(8):
+        row = []
+        for x in range(8):
+            index = bitboard.SQUARE_INDEX.get((x, y))
+            if index is None:
+                row.append('-')
+            elif position.black >> index & 1:
+                row.append('B' if position.kings >> index & 1 else 'b')
+            elif position.red >> index & 1:
+                row.append('R' if position.kings >> index & 1 else 'r')
+            else:
+                row.append('.')
+        rows.append(''.join(row))
+    return '{} {}'.format('/'.join(rows), 'r' if position.turn == RED else 'b')
+
+
+# Reject positions no game can reach: a square held by both sides, or a man on the row it would
+# have been crowned on
+def check_position(position):
+    both = position.black & position.red
+    if both:
+        raise PositionFormatError('square {} held by both sides'.format(bitboard.index_of(both & -both) + 1))
+    for side in (BLACK, RED):
+        men = position.pieces(side) & ~position.kings & bitboard.PROMOTION_ROW[side]
+        if men:
+            raise PositionFormatError('uncrowned {} man on square {}'.format(
+                'black' if side == BLACK else 'red', bitboard.index_of(men & -men) + 1))
+    return position
+
+
+def parse_position(text):
+    text = text.strip()
+    if ':' in text:
+        try:
+            return check_position(records.parse_fen(text))
+        except records.RecordError as error:
+            raise PositionFormatError(str(error))
+    try:
+        board, side = text.split()
+    except ValueError:
+        raise PositionFormatError('expected a board and a side to move: {!r}'.format(text))
+    rows = board.split('/')
+    if len(rows) != 8 or any(len(row) != 8 for row in rows) or side not in _SIDES:
+        raise PositionFormatError('bad position {!r}'.format(text))
+    masks = [0, 0]
+    kings = 0
+    for y, row in enumerate(rows):
+        for x, cell in enumerate(row):
+            if cell in '.-':
+                continue
+            index = bitboard.SQUARE_INDEX.get((x, y))
+            if cell not in _PIECES or index is None:
+                raise PositionFormatError('bad square {!r} at ({}, {}) in {!r}'.format(cell, x, y, text))
+            side_of_piece, king = _PIECES[cell]
+            masks[side_of_piece] |= 1 << index
+            if king:
+                kings |= 1 << index
+    return check_position(Position.from_masks(masks[BLACK], masks[RED], kings, _SIDES[side]))
+
+
+# The searcher of this process, set up once per worker by _init_worker
+_searcher = None
+
+
+def _init_worker(time_limit, max_depth, table_mb):
+    global _searcher
+    _searcher = search.Searcher(time_limit, max_depth, table_mb)
+
+
+def analyze_one(item, searcher):
+    text = item.strip() if isinstance(item, str) else board_text(item)
+    try:
+        position = parse_position(item) if isinstance(item, str) else check_position(item)
+    except ValueError as error:
+        return Analysis(text, None, None, None, None, None, str(error))
+    moves = position.legal_moves()
+    result = searcher.search(position, score_forced=True)
+    best = records.path_to_pdn(result.move.path, result.move.captured) if result.move is not None else None
+    return Analysis(text, best, result.score, len(moves), result.depth, result.nodes, None)
+
+
+def _analyze_chunk(chunk):
+    return [analyze_one(item, _searcher) for item in chunk]
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Analyse positions (Position objects or text) and yield an Analysis for each, in input order.
+# processes=0 analyses in this process; otherwise a pool of processes (one per core when None) works
+# on chunk_size positions at a time, with at most max_pending chunks queued (two per process by
+# default).
+def analyze(positions, time_limit=DEFAULT_TIME_LIMIT, max_depth=search.MAX_PLY, table_mb=TABLE_MB, processes=None,
+            chunk_size=CHUNK_SIZE, max_pending=None):
+    settings = (time_limit, max_depth, table_mb)
+    if processes == 0:
+        searcher = search.Searcher(*settings)
+        for item in positions:
+            yield analyze_one(item, searcher)
+        return
+
+    processes = processes or multiprocessing.cpu_count()
+    max_pending = max_pending or 2 * processes
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=settings) as pool:
+        pending = collections.deque()
+        for chunk in _chunks(positions, chunk_size):
+            pending.append(pool.apply_async(_analyze_chunk, (chunk,)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse a file of positions, one per line, to JSON lines.')
+    parser.add_argument('input', help="file of positions, or '-' for standard input")
+    parser.add_argument('-o', '--output', help='output file (default: standard output)')
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT, help='seconds per position')
+    parser.add_argument('--depth', type=int, default=search.MAX_PLY, help='maximum search depth')
+    parser.add_argument('-j', '--processes', type=int, help='worker processes, 0 for none (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        lines = (line for line in source if line.strip() and not line.startswith('#'))
+        for analysis in analyze(lines, args.time_limit, args.depth, processes=args.processes,
+                                chunk_size=args.chunk_size):
+            out.write(json.dumps(analysis._asdict()) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
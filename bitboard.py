@@ -0,0 +1,221 @@
+import collections
+
+# Bitboard helpers for the 32 playable (dark) squares of the board.
+#
+# Square index = y * 4 + x // 2, so bit 0 is (1, 0) and bit 31 is (6, 7).
+# Black starts on rows 0-2 and moves towards y = 7, red starts on rows 5-7
+# and moves towards y = 0. A board is described by three 32-bit masks:
+# black pieces, red pieces and kings (of either colour).
+
+BLACK = 0
+RED = 1
+
+FULL = 0xFFFFFFFF
+EVEN_ROWS = 0x0F0F0F0F
+ODD_ROWS = 0xF0F0F0F0
+# Squares in the rightmost (x = 7) and leftmost (x = 0) columns
+RIGHT_EDGE = 0x08080808
+LEFT_EDGE = 0x10101010
+
+BLACK_START = 0x00000FFF
+RED_START = 0xFFF00000
+# The row a man has to reach to become a king, indexed by side
+PROMOTION_ROW = (0xF0000000, 0x0000000F)
+
+# A complete move: the squares visited (as indices), the mask of captured pieces, and the masks
+# to XOR into the mover's pieces and into the kings to play it.
+Move = collections.namedtuple('Move', ['path', 'captured', 'moved', 'king_change'])
+
+SQUARE_POS = []
+SQUARE_INDEX = {}
+for _y in range(8):
+    for _x in range(8):
+        if _x % 2 != _y % 2:
+            SQUARE_INDEX[(_x, _y)] = len(SQUARE_POS)
+            SQUARE_POS.append((_x, _y))
+
+
+# Diagonal shifts of a whole mask. Even rows step by 3/4/5 in one direction and odd rows by 4/5/3,
+# so each direction combines two shifts and masks off pieces that would wrap around an edge.
+def up_right(bb):
+    return (((bb & EVEN_ROWS & ~RIGHT_EDGE) << 5) | ((bb & ODD_ROWS) << 4)) & FULL
+
+
+def up_left(bb):
+    return (((bb & EVEN_ROWS) << 4) | ((bb & ODD_ROWS & ~LEFT_EDGE) << 3)) & FULL
+
+
+def down_right(bb):
+    return ((bb & EVEN_ROWS & ~RIGHT_EDGE) >> 3) | ((bb & ODD_ROWS) >> 4)
+
+
+def down_left(bb):
+    return ((bb & EVEN_ROWS) >> 4) | ((bb & ODD_ROWS & ~LEFT_EDGE) >> 5)
+
+
+# Each direction as (step, reverse step, whether a man of the side may use it), indexed by side.
+# Kings may use all four.
+SIDE_DIRECTIONS = (
+    ((up_right, down_left, True), (up_left, down_right, True),
+     (down_right, up_left, False), (down_left, up_right, False)),
+    ((up_right, down_left, False), (up_left, down_right, False),
+     (down_right, up_left, True), (down_left, up_right, True)),
+)
+
+
+# Lookup tables built once at import, indexed by square index.
+# NEIGHBOURS[index] holds the square one step away in each direction of DIRECTION_STEPS, or None.
+# STEPS[side][is_king][index] holds (target_bit, target_index) for every square the piece may step to.
+# JUMPS[side][is_king][index] holds (jumped_bit, landing_bit, landing_index) for every jump it may make.
+DIRECTION_STEPS = (up_right, up_left, down_right, down_left)
+NEIGHBOURS = [tuple(step(1 << index).bit_length() - 1 if step(1 << index) else None for step in DIRECTION_STEPS)
+              for index in range(32)]
+# Directions a man of each side may move in, as indices into DIRECTION_STEPS
+MAN_DIRECTIONS = ((0, 1), (2, 3))
+
+
+def _build_tables():
+    steps = ([[], []], [[], []])
+    jumps = ([[], []], [[], []])
+    for side in (BLACK, RED):
+        for is_king in (False, True):
+            directions = range(4) if is_king else MAN_DIRECTIONS[side]
+            for index in range(32):
+                targets = []
+                landings = []
+                for direction in directions:
+                    middle = NEIGHBOURS[index][direction]
+                    if middle is None:
+                        continue
+                    targets.append((1 << middle, middle))
+                    landing = NEIGHBOURS[middle][direction]
+                    if landing is not None:
+                        landings.append((1 << middle, 1 << landing, landing))
+                steps[side][is_king].append(tuple(targets))
+                jumps[side][is_king].append(tuple(landings))
+    return steps, jumps
+
+
+STEPS, JUMPS = _build_tables()
+
+
+def bit(pos):
+    return 1 << SQUARE_INDEX[pos]
+
+
+def index_of(bb):
+    return bb.bit_length() - 1
+
+
+def pos_of(bb):
+    return SQUARE_POS[bb.bit_length() - 1]
+
+
+# Yield every set bit of a mask as a single-bit mask
+def iter_bits(bb):
+    while bb:
+        low = bb & -bb
+        yield low
+        bb ^= low
+
+
+def count(bb):
+    return bb.bit_count()
+
+
+# All simple (non-capturing) steps for a side as (from_bit, to_bit) pairs
+def simple_moves(own, kings, empty, side):
+    moves = []
+    king_pieces = own & kings
+    for step, back, men_allowed in SIDE_DIRECTIONS[side]:
+        movers = own if men_allowed else king_pieces
+        targets = step(movers) & empty
+        while targets:
+            to_bit = targets & -targets
+            targets ^= to_bit
+            moves.append((back(to_bit), to_bit))
+    return moves
+
+
+# All single captures for a side as (from_bit, captured_bit, to_bit) triples
+def captures(own, opp, kings, empty, side):
+    jumps = []
+    king_pieces = own & kings
+    for step, back, men_allowed in SIDE_DIRECTIONS[side]:
+        movers = own if men_allowed else king_pieces
+        targets = step(step(movers) & opp) & empty
+        while targets:
+            to_bit = targets & -targets
+            targets ^= to_bit
+            taken = back(to_bit)
+            jumps.append((back(taken), taken, to_bit))
+    return jumps
+
+
+# Mask of the pieces of a side that have at least one capture available
+def jumpers(own, opp, kings, empty, side):
+    king_pieces = own & kings
+    result = 0
+    for step, back, men_allowed in SIDE_DIRECTIONS[side]:
+        movers = own if men_allowed else king_pieces
+        result |= movers & back(back(empty) & opp)
+    return result
+
+
+# Mask of the pieces of a side that can move at all, by a step or a capture. A side with no movers
+# has lost.
+def movers(own, opp, kings, empty, side):
+    king_pieces = own & kings
+    result = 0
+    for step, back, men_allowed in SIDE_DIRECTIONS[side]:
+        pieces = own if men_allowed else king_pieces
+        result |= pieces & (back(empty) | back(back(empty) & opp))
+    return result
+
+
+# Every legal move for a side in one pass over its pieces. Captures are compulsory, and every
+# capture is followed to the end of each of its multi-jump paths. A man that is crowned ends its move.
+def generate_moves(own, opp, kings, side):
+    empty = ~(own | opp) & FULL
+    movers = jumpers(own, opp, kings, empty, side)
+    moves = []
+    if not movers:
+        promotion_row = PROMOTION_ROW[side]
+        man_steps, king_steps = STEPS[side]
+        while own:
+            start = own & -own
+            own ^= start
+            index = start.bit_length() - 1
+            if kings & start:
+                for target, target_index in king_steps[index]:
+                    if target & empty:
+                        moves.append(Move((index, target_index), 0, start | target, start | target))
+            else:
+                for target, target_index in man_steps[index]:
+                    if target & empty:
+                        moves.append(Move((index, target_index), 0, start | target, target & promotion_row))
+        return moves
+    while movers:
+        start = movers & -movers
+        movers ^= start
+        index = start.bit_length() - 1
+        _jump_sequences(moves, start, index, (index,), 0, bool(kings & start), opp, kings, empty | start, side)
+    return moves
+
+
+def _jump_sequences(moves, start, index, path, captured, is_king, opp, kings, empty, side):
+    extended = False
+    for taken, land, land_index in JUMPS[side][is_king][index]:
+        if not taken & opp or taken & captured or not land & empty:
+            continue
+        extended = True
+        if not is_king and land & PROMOTION_ROW[side]:
+            moves.append(Move(path + (land_index,), captured | taken, start | land,
+                              ((captured | taken) & kings) | land))
+        else:
+            _jump_sequences(moves, start, land_index, path + (land_index,), captured | taken, is_king, opp, kings,
+                            empty, side)
+    if not extended and captured:
+        square = 1 << index
+        moved = start ^ square
+        moves.append(Move(path, captured, moved, (captured & kings) | (moved if is_king else 0)))
@@ -0,0 +1,148 @@
+import argparse
+import array
+import bisect
+import collections
+import mmap
+import struct
+import sys
+
+import records
+import transposition
+
+# Opening books built from game records. For every position reached in the first plies of the
+# games, the book counts how each move played from it turned out for the side that played it.
+#
+# File layout (little-endian): a header, then three arrays of one element per (position, move)
+# entry: the Zobrist keys of the positions in ascending order, the transposition.move_code of the
+# moves, and the wins, draws and losses of each move. Books are memory-mapped when loaded and
+# looked up by binary search over the keys, so they are never read into the heap.
+
+MAGIC = b'CKOB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+DEFAULT_PLIES = 20
+
+BookMove = collections.namedtuple('BookMove', ['move', 'wins', 'draws', 'losses'])
+
+
+def _games(entry):
+    return entry.wins + entry.draws + entry.losses
+
+
+# Share of the points the move scored for its side, counting a draw as half a win
+def book_score(entry):
+    return (entry.wins + entry.draws / 2) / _games(entry)
+
+
+# Count the results of every move played in the first plies of each game of records. Games with an
+# unknown result are skipped.
+def aggregate(games, plies=DEFAULT_PLIES):
+    stats = collections.defaultdict(lambda: [0, 0, 0])
+    for game in games:
+        if game.result == records.UNKNOWN:
+            continue
+        for position, move in zip(records.positions(game), game.moves[:plies]):
+            counts = stats[position.zobrist, transposition.move_code(move)]
+            if game.result == records.DRAW:
+                counts[1] += 1
+            elif game.result == position.turn:
+                counts[0] += 1
+            else:
+                counts[2] += 1
+    return stats
+
+
+def write(path, stats, plies=DEFAULT_PLIES, min_games=1):
+    entries = sorted(item for item in stats.items() if sum(item[1]) >= min_games)
+    keys = array.array('Q', [key for (key, code), counts in entries])
+    codes = array.array('Q', [code for (key, code), counts in entries])
+    counts = array.array('I', [count for entry, entry_counts in entries for count in entry_counts])
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, plies, len(entries)))
+        for values in (keys, codes, counts):
+            if sys.byteorder == 'big':
+                values.byteswap()
+            out.write(values.tobytes())
+
+
+def build(games, path, plies=DEFAULT_PLIES, min_games=1):
+    write(path, aggregate(games, plies), plies, min_games)
+
+
+# An opening book opened for lookups
+class Book:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = ()
+        magic, version, self.plies, self.size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} opening book file'.format(path, VERSION))
+        view = memoryview(self._map)
+        start = HEADER.size
+        self._keys = view[start:start + 8 * self.size].cast('Q')
+        start += 8 * self.size
+        self._codes = view[start:start + 8 * self.size].cast('Q')
+        start += 8 * self.size
+        self._counts = view[start:start + 12 * self.size].cast('I')
+        self._views = (self._keys, self._codes, self._counts)
+        view.release()
+
+    def __len__(self):
+        return self.size
+
+    # The book moves of a position with their results, most successful first
+    def probe(self, position):
+        key = position.zobrist
+        first = bisect.bisect_left(self._keys, key)
+        if first == self.size or self._keys[first] != key:
+            return []
+        moves = position.legal_moves()
+        result = []
+        entry = first
+        while entry < self.size and self._keys[entry] == key:
+            move = transposition.find_move(moves, self._codes[entry])
+            # A Zobrist collision can only suggest moves that are illegal here
+            if move is not None:
+                result.append(BookMove(move, *self._counts[3 * entry:3 * entry + 3]))
+            entry += 1
+        result.sort(key=book_score, reverse=True)
+        return result
+
+    # The best scoring book move of a position that was played in at least min_games games, or None
+    def choose(self, position, min_games=1):
+        for entry in self.probe(position):
+            if _games(entry) >= min_games:
+                return entry.move
+        return None
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = ()
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build an opening book from binary game record files.')
+    parser.add_argument('output')
+    parser.add_argument('games', nargs='+', help='game record files, as written by tournament.py --record')
+    parser.add_argument('--plies', type=int, default=DEFAULT_PLIES, help='number of opening plies to keep')
+    parser.add_argument('--min-games', type=int, default=1, help='drop moves played in fewer games')
+    args = parser.parse_args(argv)
+
+    def games():
+        for path in args.games:
+            yield from records.read_records(path)
+
+    stats = aggregate(games(), args.plies)
+    write(args.output, stats, args.plies, args.min_games)
+    print('{} positions, {} moves'.format(len({key for key, code in stats}), len(stats)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
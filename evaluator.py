@@ -0,0 +1,126 @@
+import numpy as np
+
+import bitboard
+from logic import CellValue
+
+# Batched position evaluation. A batch of N boards is an (N, 32) int8 array holding the CellValue of
+# each playable square in bitboard square order (the GameLogic.board layout with the light squares
+# dropped), or the equivalent black, red and king uint32 masks. Features are computed for the
+# whole batch at once, always as black minus red.
+
+FEATURES = ('men', 'kings', 'advancement', 'back_row', 'mobility')
+# Weights of FEATURES. Men and kings use the same scale as search.evaluate.
+WEIGHTS = np.array([100, 160, 2, 8, 3], dtype=np.int64)
+
+_ROWS = np.array([y for x, y in bitboard.SQUARE_POS], dtype=np.int64)
+_DARK_X = np.array([x for x, y in bitboard.SQUARE_POS])
+_DARK_Y = np.array([y for x, y in bitboard.SQUARE_POS])
+
+_EVEN_ROWS = np.uint32(bitboard.EVEN_ROWS)
+_ODD_ROWS = np.uint32(bitboard.ODD_ROWS)
+_EVEN_NOT_RIGHT = np.uint32(bitboard.EVEN_ROWS & ~bitboard.RIGHT_EDGE)
+_ODD_NOT_LEFT = np.uint32(bitboard.ODD_ROWS & ~bitboard.LEFT_EDGE)
+
+
+def _up_right(bb):
+    return ((bb & _EVEN_NOT_RIGHT) << 5) | ((bb & _ODD_ROWS) << 4)
+
+
+def _up_left(bb):
+    return ((bb & _EVEN_ROWS) << 4) | ((bb & _ODD_NOT_LEFT) << 3)
+
+
+def _down_right(bb):
+    return ((bb & _EVEN_NOT_RIGHT) >> 3) | ((bb & _ODD_ROWS) >> 4)
+
+
+def _down_left(bb):
+    return ((bb & _EVEN_ROWS) >> 4) | ((bb & _ODD_NOT_LEFT) >> 5)
+
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(bb):
+        return np.bitwise_count(bb).astype(np.int64)
+else:
+    def _popcount(bb):
+        octets = np.ascontiguousarray(bb, dtype='<u4').view(np.uint8).reshape(-1, 4)
+        return np.unpackbits(octets, axis=1).sum(axis=1, dtype=np.int64)
+
+
+# Pack GameLogic.board grids (8x8 lists of CellValue) into an (N, 32) array of CellValue codes
+def pack_boards(boards):
+    grid = np.array([[[cell.value for cell in row] for row in board] for board in boards], dtype=np.int8)
+    return np.ascontiguousarray(grid.reshape(-1, 8, 8)[:, _DARK_Y, _DARK_X])
+
+
+# Pack Positions into black, red and king uint32 mask arrays and an array of sides to move
+def pack_positions(positions):
+    packed = np.array([position[:4] for position in positions], dtype=np.uint32).reshape(-1, 4)
+    return packed[:, 0], packed[:, 1], packed[:, 2], packed[:, 3]
+
+
+def squares_from_bitboards(black, red, kings):
+    def bits(masks):
+        return np.unpackbits(np.ascontiguousarray(masks, dtype='<u4').view(np.uint8).reshape(-1, 4), axis=1,
+                             bitorder='little').astype(np.int8)
+    king_bits = bits(kings)
+    # BLACK + 3 == BLACK_KING and RED + 3 == RED_KING
+    return (bits(black) * CellValue.BLACK.value + bits(red) * CellValue.RED.value
+            + king_bits * (CellValue.BLACK_KING.value - CellValue.BLACK.value))
+
+
+def bitboards_from_squares(squares):
+    def masks(occupied):
+        return np.packbits(occupied, axis=1, bitorder='little').view('<u4').reshape(-1)
+    black = (squares == CellValue.BLACK.value) | (squares == CellValue.BLACK_KING.value)
+    red = (squares == CellValue.RED.value) | (squares == CellValue.RED_KING.value)
+    kings = (squares == CellValue.BLACK_KING.value) | (squares == CellValue.RED_KING.value)
+    return masks(black), masks(red), masks(kings)
+
+
+# Number of simple moves available to a side, counted one direction at a time over the whole batch
+def _mobility(own, kings, empty, forward):
+    king_pieces = own & kings
+    total = np.zeros(own.shape, dtype=np.int64)
+    for step in (_up_right, _up_left, _down_right, _down_left):
+        movers = own if step in forward else king_pieces
+        total += _popcount(step(movers) & empty)
+    return total
+
+
+# (N, len(FEATURES)) feature matrix for an (N, 32) array of CellValue codes
+def features(squares):
+    # packbits in bitboards_from_squares needs rows laid out contiguously
+    squares = np.ascontiguousarray(squares, dtype=np.int8).reshape(-1, 32)
+    black_men = squares == CellValue.BLACK.value
+    red_men = squares == CellValue.RED.value
+    black_kings = squares == CellValue.BLACK_KING.value
+    red_kings = squares == CellValue.RED_KING.value
+
+    black, red, kings = bitboards_from_squares(squares)
+    empty = ~(black | red)
+    mobility = (_mobility(black, kings, empty, (_up_right, _up_left))
+                - _mobility(red, kings, empty, (_down_right, _down_left)))
+
+    return np.stack([
+        black_men.sum(axis=1, dtype=np.int64) - red_men.sum(axis=1, dtype=np.int64),
+        black_kings.sum(axis=1, dtype=np.int64) - red_kings.sum(axis=1, dtype=np.int64),
+        (black_men * _ROWS).sum(axis=1) - (red_men * (7 - _ROWS)).sum(axis=1),
+        black_men[:, _ROWS == 0].sum(axis=1, dtype=np.int64) - red_men[:, _ROWS == 7].sum(axis=1, dtype=np.int64),
+        mobility,
+    ], axis=1)
+
+
+# Scores for an (N, 32) array of CellValue codes, from black's point of view, or from the side to
+# move's when an array of turns (0 black, 1 red) is given
+def evaluate_squares(squares, turns=None):
+    scores = features(squares) @ WEIGHTS
+    if turns is not None:
+        scores = np.where(np.asarray(turns) == bitboard.RED, -scores, scores)
+    return scores
+
+
+# Scores for a sequence of Positions, from the point of view of each one's side to move
+def evaluate_positions(positions):
+    black, red, kings, turns = pack_positions(positions)
+    return evaluate_squares(squares_from_bitboards(black, red, kings), turns)
@@ -0,0 +1,62 @@
+import collections
+
+from logic import GameLogic, Outcome, Player
+
+MAX_PLIES = 300
+
+GameResult = collections.namedtuple('GameResult', ['winner', 'plies', 'logic'])
+
+
+# Play one game between two AI players with no display attached. Player 1 is black and moves first.
+# The game ends when GameLogic.game_over says so, or as a draw (winner None) after max_plies.
+# Every position reached, starting with the first, is appended to history when a list is given.
+def play_game(player_1, player_2, max_plies=MAX_PLIES, logic=None, history=None):
+    if logic is None:
+        logic = GameLogic()
+    players = {Player.BLACK: player_1, Player.RED: player_2}
+    plies = 0
+    if history is not None:
+        history.append(logic.position)
+    while True:
+        outcome = logic.game_over()
+        if outcome is not None:
+            return GameResult(None if outcome == Outcome.DRAW else Player(outcome.value), plies, logic)
+        if plies >= max_plies:
+            return GameResult(None, plies, logic)
+        player = logic.player_turn
+        ai = players[player]
+        while not ai.move_made():
+            ai.begin_move(logic, None, None, player)
+        ai.reset_data()
+        logic.set_take_made(False)
+        logic.change_player(logic.next_player())
+        plies += 1
+        if history is not None:
+            history.append(logic.position)
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import profiling
+    from players import MiniMaxPlayer, RandomPlayer
+
+    parser = argparse.ArgumentParser(description='Play one search player vs random player game without a display.')
+    parser.add_argument('--instrument', action='store_true', help='print call counts and times of the engine hot paths')
+    parser.add_argument('--profile', metavar='PATH', help='run the game under cProfile and save its stats to PATH')
+    args = parser.parse_args(argv)
+
+    if args.instrument:
+        profiling.enable()
+    players = (MiniMaxPlayer(time_limit=0.1, verbose=False), RandomPlayer())
+    if args.profile:
+        result = profiling.profile_call(args.profile, play_game, *players)
+    else:
+        result = play_game(*players)
+    print('winner: {}, plies: {}'.format(result.winner.name if result.winner else 'draw', result.plies))
+    if profiling.enabled():
+        print(json.dumps(profiling.summary(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import server
+
+# Load test for server.py: many clients, each playing games against the server's AI (or both sides of
+# shared games) with random moves over its own connection. Reports moves/s and move latency
+# percentiles. Latency is measured per move request, so against an AI it includes the AI's reply.
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = []
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        return response
+
+    async def play(self, games, opponent, time_limit, rng):
+        for _ in range(games):
+            state = await self.request(op='new', opponent=opponent, color=rng.choice(('black', 'red')),
+                                       time_limit=time_limit)
+            while state['status'] == 'playing':
+                start = time.perf_counter()
+                state = await self.request(op='move', game=state['game'], move=rng.choice(state['moves']))
+                self.latencies.append(time.perf_counter() - start)
+            await self.request(op='close', game=state['game'])
+
+
+async def _connect(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(clients, games, opponent, time_limit, host='127.0.0.1', port=server.DEFAULT_PORT, unix_path=None,
+              seed=0):
+    connections = [Client(*await _connect(host, port, unix_path)) for _ in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client.play(games, opponent, time_limit, random.Random(seed + number))
+                           for number, client in enumerate(connections)))
+    elapsed = time.perf_counter() - start
+    for client in connections:
+        client.writer.close()
+    latencies = [latency for client in connections for latency in client.latencies]
+    return {
+        'clients': clients,
+        'games': clients * games,
+        'moves': len(latencies),
+        'seconds': round(elapsed, 3),
+        'moves_per_second': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test a running checkers game server.')
+    parser.add_argument('-c', '--clients', type=int, default=100, help='concurrent connections')
+    parser.add_argument('-g', '--games', type=int, default=1, help='games per client')
+    parser.add_argument('--opponent', choices=server.AI_TYPES + ('none',), default='random',
+                        help='AI the clients play against; none plays both sides')
+    parser.add_argument('--time-limit', type=float, default=0.01, help='AI seconds per move')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=server.DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='connect to a Unix socket instead of TCP')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    opponent = None if args.opponent == 'none' else args.opponent
+    report = asyncio.run(run(args.clients, args.games, opponent, args.time_limit, args.host, args.port, args.unix,
+                             args.seed))
+    print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
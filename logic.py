@@ -0,0 +1,290 @@
+import enum
+
+import bitboard
+from position import Position
+
+
+class CellValue(enum.Enum):
+    EMPTY = 0
+    BLACK = 1
+    RED = 2
+    INVALID = 3
+    BLACK_KING = 4
+    RED_KING = 5
+
+
+class Player(enum.Enum):
+    BLACK = 0
+    RED = 1
+
+
+class Outcome(enum.Enum):
+    BLACK_WINS = 0
+    RED_WINS = 1
+    DRAW = 2
+
+
+# A game is drawn when the same position, with the same side to move, occurs this many times
+REPETITIONS = 3
+# or after this many plies in a row with no capture and no man moved (40 moves each)
+QUIET_PLIES = 80
+
+
+class GameLogic:
+    # CellValue of a square indexed by (is_red, is_king), or EMPTY if neither side owns it
+    _piece_values = {
+        (False, False): CellValue.BLACK,
+        (False, True): CellValue.BLACK_KING,
+        (True, False): CellValue.RED,
+        (True, True): CellValue.RED_KING,
+    }
+
+    def __init__(self):
+        self.take_made = False
+        self.take_position = None
+        # Number of turns played so far
+        self.plies = 0
+        self.position = Position.initial()
+        # Callables told about every move played, as observer(before, after, path): the positions
+        # before and after it and the square indices it visited. A multi-jump played one hop at a
+        # time through perform_move is reported hop by hop.
+        self.observers = []
+
+    # Assigning a position starts the bookkeeping afresh from it: piece and king counts are recounted
+    # and the repetition history holds just this position. Moves update them incrementally.
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        self._position = position
+        # Pieces and kings of each side, indexed by Player.value
+        self.piece_counts = [position.black.bit_count(), position.red.bit_count()]
+        self.king_counts = [(position.black & position.kings).bit_count(), (position.red & position.kings).bit_count()]
+        # Occurrences of each position (by Zobrist key) since the last capture or man move, and the
+        # number of turns since then
+        self.history = {position.zobrist: 1}
+        self.quiet_plies = 0
+        self._turn_irreversible = False
+
+    @property
+    def player_turn(self):
+        return Player(self.position.turn)
+
+    # The board as an 8x8 grid of CellValue, indexed as board[y][x]
+    @property
+    def board(self):
+        return [[self.value_at((x, y)) for x in range(8)] for y in range(8)]
+
+    def player_owns_square(self, player, pos):
+        index = bitboard.SQUARE_INDEX.get(pos)
+        if index is None:
+            return False
+        return bool(self.position.pieces(player.value) >> index & 1)
+
+    # Get the value of a position on the board
+    def value_at(self, pos):
+        if pos is not None:
+            x, y = pos
+            if y > 7 or y < 0:
+                return None
+            if x > 7 or x < 0:
+                return None
+            index = bitboard.SQUARE_INDEX.get(pos)
+            if index is None:
+                return CellValue.INVALID
+            square = 1 << index
+            black, red, kings = self.position[:3]
+            if not (black | red) & square:
+                return CellValue.EMPTY
+            return self._piece_values[(bool(red & square), bool(kings & square))]
+
+    # Set the value at a position on the board
+    def set_value_at(self, pos, value):
+        if pos is not None:
+            square = bitboard.bit(pos)
+            black, red, kings = self.position[:3]
+            black &= ~square
+            red &= ~square
+            kings &= ~square
+            if value == CellValue.BLACK or value == CellValue.BLACK_KING:
+                black |= square
+            elif value == CellValue.RED or value == CellValue.RED_KING:
+                red |= square
+            if value == CellValue.BLACK_KING or value == CellValue.RED_KING:
+                kings |= square
+            self._position = self.position.with_masks(black, red, kings)
+            self.piece_counts = [black.bit_count(), red.bit_count()]
+            self.king_counts = [(black & kings).bit_count(), (red & kings).bit_count()]
+
+    # Check if a piece at a specific position is a king piece
+    def is_king(self, pos, player):
+        index = bitboard.SQUARE_INDEX.get(pos)
+        if index is None:
+            return False
+        return bool((self.position.pieces(player.value) & self.position.kings) >> index & 1)
+
+    # Make a piece a king piece if the piece has moved to the other end of the board.
+    def make_king(self, end_pos):
+        position = self.position
+        side = position.turn
+        square = position.pieces(side) & ~position.kings & bitboard.PROMOTION_ROW[side] & bitboard.bit(end_pos)
+        if square:
+            self._position = position.toggle_pieces(0, 0, square)
+            self.king_counts[side] += 1
+
+    # Return the player who turn it is next
+    def next_player(self):
+        if self.player_turn == Player.BLACK:
+            return Player.RED
+        else:
+            return Player.BLACK
+
+    # Pass the turn. A completed turn is added to the repetition history, which starts over after
+    # a capture or a man move, since no earlier position can occur again.
+    def change_player(self, player):
+        if player.value == self.position.turn:
+            return
+        self._position = self.position.with_turn(player.value)
+        self.plies += 1
+        if self._turn_irreversible:
+            self.history = {}
+            self.quiet_plies = 0
+            self._turn_irreversible = False
+        else:
+            self.quiet_plies += 1
+        key = self._position.zobrist
+        self.history[key] = self.history.get(key, 0) + 1
+
+    # Return the direction that each player is moving in the y-axis
+    def player_direction(self, player):
+        if player == Player.BLACK:
+            return 1
+        else:
+            return -1
+
+    # Return the position of the piece captured by moving from start_pos to end_pos, if any
+    def check_for_take(self, start_pos, end_pos):
+        start = bitboard.SQUARE_INDEX.get(start_pos)
+        end = bitboard.SQUARE_INDEX.get(end_pos)
+        if start is None or end is None:
+            return None
+        taken = self.position.taken_between(1 << start, 1 << end)
+        if taken:
+            return bitboard.pos_of(taken)
+        return None
+
+    # Check that the desired move is a legal one
+    def is_legal(self, start_pos, end_pos):
+        start = bitboard.SQUARE_INDEX.get(start_pos)
+        end = bitboard.SQUARE_INDEX.get(end_pos)
+        if start is None or end is None:
+            return False
+        position = self.position
+        side = position.turn
+        start_square = 1 << start
+        end_square = 1 << end
+        if not position.pieces(side) & start_square:
+            return False
+        if not position.empty() & end_square:
+            return False
+        for target, target_index in bitboard.STEPS[side][bool(position.kings & start_square)][start]:
+            if target == end_square:
+                return True
+        return bool(position.taken_between(start_square, end_square))
+
+    def perform_move(self, start_pos, end_pos):
+        position = self.position
+        start_square = bitboard.bit(start_pos)
+        end_square = bitboard.bit(end_pos)
+        taken = position.taken_between(start_square, end_square)
+        king_change = taken & position.kings
+        if position.kings & start_square:
+            king_change ^= start_square | end_square
+        else:
+            self._turn_irreversible = True
+        self._position = position.toggle_pieces(start_square | end_square, taken, king_change)
+        if taken:
+            self._count_captured(position.turn ^ 1, 1, taken & position.kings)
+        self.make_king(end_pos)
+        self.notify(position, (bitboard.SQUARE_INDEX[start_pos], bitboard.SQUARE_INDEX[end_pos]))
+
+        if taken:
+            self.set_take_made(True)
+            self.take_position = end_pos
+
+    # Check if a jump can be made after a take
+    def check_for_jump(self, start_pos):
+        position = self.position
+        side = position.turn
+        start = bitboard.SQUARE_INDEX[start_pos]
+        if not position.pieces(side) >> start & 1:
+            return False
+        opp = position.pieces(side ^ 1)
+        empty = position.empty()
+        for taken, land, land_index in bitboard.JUMPS[side][bool(position.kings >> start & 1)][start]:
+            if taken & opp and land & empty:
+                return True
+        return False
+
+    def set_take_made(self, is_take_made):
+        self.take_made = is_take_made
+
+    def get_moves(self, player):
+        side = player.value
+        position = self.position
+        own = position.pieces(side)
+        empty = position.empty()
+        legal_moves = [(bitboard.pos_of(start), bitboard.pos_of(end))
+                       for start, end in bitboard.simple_moves(own, position.kings, empty, side)]
+        legal_moves.extend((bitboard.pos_of(start), bitboard.pos_of(end))
+                           for start, taken, end in bitboard.captures(own, position.pieces(side ^ 1), position.kings,
+                                                                      empty, side))
+        return legal_moves
+
+    # Every complete legal move for a player, as bitboard.Move sequences. Captures are compulsory
+    # and multi-jumps are followed to the end.
+    def legal_moves(self, player):
+        return self.position.with_turn(player.value).legal_moves()
+
+    # Apply a complete move from legal_moves for the player whose turn it is
+    def perform_sequence(self, move):
+        position = self.position
+        self._position = position.toggle_pieces(move.moved, move.captured, move.king_change)
+        start_square = 1 << move.path[0]
+        if not position.kings & start_square:
+            self._turn_irreversible = True
+            if move.king_change & 1 << move.path[-1]:
+                self.king_counts[position.turn] += 1
+        if move.captured:
+            self._count_captured(position.turn ^ 1, move.captured.bit_count(), move.captured & position.kings)
+        self.notify(position, move.path)
+        if move.captured:
+            self.set_take_made(True)
+            self.take_position = bitboard.SQUARE_POS[move.path[-1]]
+
+    def notify(self, before, path):
+        for observer in self.observers:
+            observer(before, self.position, path)
+
+    def _count_captured(self, side, pieces, kings):
+        self.piece_counts[side] -= pieces
+        self._turn_irreversible = True
+        if kings:
+            self.king_counts[side] -= kings.bit_count()
+
+    # The Outcome of the game if it is over, or None. Meant to be called between turns, it costs a
+    # handful of mask operations and no move generation: the side to move loses with no pieces or no
+    # piece able to move, and the game is drawn by repetition or after QUIET_PLIES quiet plies.
+    def game_over(self):
+        position = self._position
+        side = position.turn
+        if self.piece_counts[side] == 0:
+            return Outcome(side ^ 1)
+        own = position.pieces(side)
+        if not bitboard.movers(own, position.pieces(side ^ 1), position.kings, position.empty(), side):
+            return Outcome(side ^ 1)
+        if self.history.get(position.zobrist, 0) >= REPETITIONS or self.quiet_plies >= QUIET_PLIES:
+            return Outcome.DRAW
+        return None
@@ -0,0 +1,241 @@
+import collections
+import math
+import multiprocessing
+import random
+import time
+
+import bitboard
+from players import PlayerType, book_move, show_selection
+from position import Position
+
+# Monte Carlo tree search with UCT selection and random playouts.
+#
+# Playouts are run in batches: a batch of leaves is selected first, each taking a virtual visit
+# along its path so that the rest of the batch spreads over other branches, and then all of their
+# playouts are run together, either in this process or spread over a process pool. The tree is
+# kept between moves, and the subtree of the position the opponent's reply leads to becomes the
+# next root.
+
+EXPLORATION = 1.4
+BATCH_SIZE = 32
+# A playout still going after this many plies counts as a draw
+MAX_PLAYOUT_PLIES = 200
+
+
+class MCTSResult(collections.namedtuple('MCTSResult', ['move', 'win_rate', 'playouts', 'reused', 'elapsed'])):
+    __slots__ = ()
+
+    @property
+    def playouts_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.playouts / self.elapsed
+
+    def __str__(self):
+        return '{} playouts in {:.2f}s ({:.0f} playouts/s), {} reused, win rate {:.2f}'.format(
+            self.playouts, self.elapsed, self.playouts_per_second, self.reused, self.win_rate)
+
+
+class Node:
+    __slots__ = ('position', 'move', 'parent', 'children', 'untried', 'visits', 'score')
+
+    def __init__(self, position, move=None, parent=None):
+        self.position = position
+        self.move = move
+        self.parent = parent
+        self.children = []
+        # Moves not expanded yet, generated on the first visit
+        self.untried = None
+        self.visits = 0
+        # Sum of the playout results for the side that played move: 1 a win, 0.5 a draw
+        self.score = 0.0
+
+
+# Play random moves from the position given as (black, red, kings, turn) masks to the end of the
+# game. Returns the winning side, or None for a draw.
+def playout(masks, seed):
+    rng = random.Random(seed)
+    position = Position(*masks, 0)
+    for ply in range(MAX_PLAYOUT_PLIES):
+        moves = position.legal_moves()
+        if not moves:
+            return position.turn ^ 1
+        position = position.make_move(moves[rng.randrange(len(moves))])
+    return None
+
+
+def _playout_task(task):
+    return playout(*task)
+
+
+class MCTS:
+    def __init__(self, exploration=EXPLORATION, batch_size=BATCH_SIZE, processes=None, seed=None):
+        self.exploration = exploration
+        self.batch_size = batch_size
+        self.processes = processes
+        self.random = random.Random(seed)
+        self.root = None
+        self._pool = None
+
+    # Make the root the node of position, keeping its subtree if the tree already holds it
+    def _set_root(self, position):
+        if self.root is not None:
+            for node in [self.root] + self.root.children:
+                if node.position == position:
+                    self.root = node
+                    break
+                found = next((child for child in node.children if child.position == position), None)
+                if found is not None:
+                    self.root = found
+                    break
+            else:
+                self.root = None
+        if self.root is None:
+            self.root = Node(position)
+        self.root.parent = None
+        self.root.move = None
+
+    def _uct(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+
+        def uct(child):
+            return child.score / child.visits + exploration * math.sqrt(log_visits / child.visits)
+        return max(node.children, key=uct)
+
+    # Walk down by UCT to a node with an untried move and expand it, or to a finished game
+    def _select(self):
+        node = self.root
+        while True:
+            if node.untried is None:
+                node.untried = node.position.legal_moves()
+                self.random.shuffle(node.untried)
+            if node.untried:
+                move = node.untried.pop()
+                child = Node(node.position.make_move(move), move, node)
+                node.children.append(child)
+                return child
+            if not node.children:
+                return node
+            node = self._uct(node)
+
+    def _playouts(self, leaves):
+        tasks = [(leaf.position[:4], self.random.getrandbits(32)) for leaf in leaves]
+        if self.processes is not None and self.processes <= 1:
+            return [playout(*task) for task in tasks]
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        chunk = max(1, len(tasks) // (self.processes or multiprocessing.cpu_count()))
+        return self._pool.map(_playout_task, tasks, chunk)
+
+    def _run_batch(self, size):
+        leaves = []
+        for _ in range(size):
+            node = self._select()
+            leaves.append(node)
+            # Visit the path now, so later selections in this batch are steered elsewhere
+            while node is not None:
+                node.visits += 1
+                node = node.parent
+        for leaf, winner in zip(leaves, self._playouts(leaves)):
+            node = leaf
+            while node.parent is not None:
+                mover = node.parent.position.turn
+                node.score += 0.5 if winner is None else float(winner == mover)
+                node = node.parent
+
+    # Run playouts from position until either budget runs out and return the most visited move.
+    # playouts is a number of playouts and time_limit a number of seconds; either may be None, but
+    # not both. At least one batch is always run, however small the budget.
+    def search(self, position, playouts=None, time_limit=1.0):
+        if playouts is None and time_limit is None:
+            raise ValueError('MCTS.search needs a playout or time budget')
+        start = time.perf_counter()
+        self._set_root(position)
+        root = self.root
+        reused = root.visits
+        if root.untried is None:
+            root.untried = position.legal_moves()
+            self.random.shuffle(root.untried)
+        if not root.untried and not root.children:
+            return MCTSResult(None, 0.0, 0, reused, 0.0)
+
+        done = 0
+        while True:
+            size = self.batch_size if playouts is None else max(1, min(self.batch_size, playouts - done))
+            self._run_batch(size)
+            done += size
+            if playouts is not None and done >= playouts:
+                break
+            if time_limit is not None and time.perf_counter() - start >= time_limit:
+                break
+
+        best = max(root.children, key=lambda child: child.visits)
+        self.root = best
+        return MCTSResult(best.move, best.score / best.visits, done, reused, time.perf_counter() - start)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+
+# An anytime player: it runs MCTS playouts until playouts are used up or time_limit seconds have
+# passed, whichever comes first. With processes set to 0 or 1 the playouts run in this process;
+# otherwise they are spread over a pool of that many processes (all cores when None). Given a book,
+# it plays book moves for the first book_plies plies, like the other players.
+class MCTSPlayer(PlayerType):
+    def __init__(self, playouts=None, time_limit=1.0, processes=None, batch_size=BATCH_SIZE,
+                 exploration=EXPLORATION, seed=None, verbose=True, book=None, book_plies=0):
+        self.book = book
+        self.book_plies = book_plies
+        self.book_moves = 0
+        self._move_made = False
+        self.state = self.state_1
+        self._move = None
+        self._start_pos = None
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.tree = MCTS(exploration, batch_size, processes, seed)
+        self.last_search = None
+        self.total_playouts = 0
+        self.verbose = verbose
+
+    def move_made(self):
+        if self._move:
+            return self._move_made
+
+    def begin_move(self, logic, graphics, screen, player):
+        self.state(logic, graphics, screen, player)
+
+    def state_1(self, logic, graphics, screen, player):
+        self._move = book_move(self.book, self.book_plies, logic, player)
+        if self._move is not None:
+            self.book_moves += 1
+            if self.verbose:
+                print('{}: book move'.format(player.name))
+            self._start_pos = bitboard.SQUARE_POS[self._move.path[0]]
+            self.state = self.state_2
+            return
+        self.last_search = self.tree.search(logic.position.with_turn(player.value), self.playouts, self.time_limit)
+        self.total_playouts += self.last_search.playouts
+        if self.verbose:
+            print('{}: {}'.format(player.name, self.last_search))
+        self._move = self.last_search.move
+        if self._move is not None:
+            self._start_pos = bitboard.SQUARE_POS[self._move.path[0]]
+            self.state = self.state_2
+
+    def state_2(self, logic, graphics, screen, player):
+        show_selection(logic, graphics, screen, self._start_pos, player)
+        logic.perform_sequence(self._move)
+        self._move_made = True
+
+    def close(self):
+        self.tree.close()
+
+    def reset_data(self):
+        self._move_made = False
+        self.state = self.state_1
+        self._move = None
+        self._start_pos = None
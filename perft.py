@@ -0,0 +1,192 @@
+import argparse
+import sys
+import time
+
+import bitboard
+import records
+from logic import GameLogic
+
+# Perft: count the leaf nodes of the move tree to a fixed depth. A complete move, multi-jumps
+# included, is one ply. The counts check the move generator against known values, and the time
+# taken is a benchmark for it.
+#
+# Three move generators can be counted, and must agree:
+#   position  Position.legal_moves and make_move, what the search uses
+#   logic     GameLogic.legal_moves and perform_sequence
+#   hops      the one-hop GameLogic API the interactive players use: get_moves, check_for_take,
+#             perform_move and check_for_jump, with captures forced and multi-jumps followed
+#             hop by hop until they end or the piece is crowned
+
+# (name, FEN, reference counts from depth 1). The opening counts are the published ones for
+# English draughts; the others come from the position generator and were checked with hops.
+TEST_POSITIONS = [
+    ('opening', 'B:W21,22,23,24,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11,12',
+     [7, 49, 302, 1469, 7361, 36768, 179740, 845931]),
+    ('middle game', 'B:W21,22,23,25,29,30,31,32:B1,2,3,4,9,10,12,14,24',
+     [14, 116, 964, 4917, 33275, 159935]),
+    ('king jumps', 'B:W6,7,14,15,22,23,30,K19:BK1,K32,9',
+     [4, 22, 67, 500, 2207, 16213]),
+    ('crowning jump', 'B:W26,27,19,11,28:B22,23,K5',
+     [3, 9, 49, 307, 1670, 10016, 57975]),
+    ('crowning double jump', 'B:W17,18,26,27,20:B13,14,K3',
+     [4, 16, 48, 250, 1296, 6602, 31816]),
+    ('kings', 'W:WK10,K11,K26,K27:BK6,K7,K23,K24',
+     [6, 21, 85, 657, 4506, 28526]),
+]
+
+MODES = ('position', 'logic', 'hops')
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for move in moves:
+        total += perft(position.make_move(move), depth - 1)
+    return total
+
+
+def _logic_children(logic):
+    parent = logic.position
+    children = []
+    for move in logic.legal_moves(logic.player_turn):
+        logic.perform_sequence(move)
+        children.append((records.path_to_pdn(move.path, move.captured), logic.position))
+        logic.position = parent
+    return children
+
+
+def _hops_to_pdn(path, captures):
+    return records.path_to_pdn([bitboard.SQUARE_INDEX[pos] for pos in path], captures)
+
+
+# The captures of the side to move, as (start, end) pairs, optionally only those of one piece
+def _takes(logic, start_pos=None):
+    return [(start, end) for start, end in logic.get_moves(logic.player_turn)
+            if (start_pos is None or start == start_pos) and logic.check_for_take(start, end) is not None]
+
+
+# Follow every jump from the current position to the end of the move, adding each final position
+def _finish_jumps(logic, start, end, path, children):
+    parent = logic.position
+    was_king = logic.is_king(start, logic.player_turn)
+    logic.perform_move(start, end)
+    path = path + [end]
+    crowned = not was_king and logic.is_king(end, logic.player_turn)
+    if not crowned and logic.check_for_jump(end):
+        for next_start, next_end in _takes(logic, end):
+            _finish_jumps(logic, next_start, next_end, path, children)
+    else:
+        children.append((_hops_to_pdn(path, True), logic.position))
+    logic.position = parent
+
+
+def _hop_children(logic):
+    parent = logic.position
+    children = []
+    takes = _takes(logic)
+    if takes:
+        for start, end in takes:
+            _finish_jumps(logic, start, end, [start], children)
+    else:
+        for start, end in logic.get_moves(logic.player_turn):
+            logic.perform_move(start, end)
+            children.append((_hops_to_pdn([start, end], False), logic.position))
+            logic.position = parent
+    return children
+
+
+# Perft through a GameLogic, for the logic and hops modes
+def logic_perft(logic, depth, children):
+    if depth == 0:
+        return 1
+    parent = logic.position
+    total = 0
+    for name, child in children(logic):
+        logic.position = child.with_turn(child.turn ^ 1)
+        total += logic_perft(logic, depth - 1, children) if depth > 1 else 1
+    logic.position = parent
+    return total
+
+
+def _counter(mode):
+    if mode == 'position':
+        return perft
+    children = _logic_children if mode == 'logic' else _hop_children
+
+    def count(position, depth):
+        logic = GameLogic()
+        logic.position = position
+        return logic_perft(logic, depth, children)
+    return count
+
+
+# Leaf counts below each root move, for tracking down a generator bug
+def divide(position, depth, mode='position'):
+    count = _counter(mode)
+    if mode == 'position':
+        children = [(records.path_to_pdn(move.path, move.captured), position.make_move(move))
+                    for move in position.legal_moves()]
+    else:
+        logic = GameLogic()
+        logic.position = position
+        children = [(name, child.with_turn(child.turn ^ 1))
+                    for name, child in (_logic_children if mode == 'logic' else _hop_children)(logic)]
+    return [(name, count(child, depth - 1)) for name, child in children]
+
+
+# Count position to depth, returning (nodes, seconds)
+def timed(position, depth, mode='position'):
+    start = time.perf_counter()
+    nodes = _counter(mode)(position, depth)
+    return nodes, time.perf_counter() - start
+
+
+def _report(label, nodes, elapsed, expected=None):
+    rate = nodes / elapsed if elapsed > 0 else 0
+    status = '' if expected is None else ('  ok' if nodes == expected else '  FAIL (expected {})'.format(expected))
+    print('{:<24} {:>12} nodes {:>8.2f}s {:>12.0f} nodes/s{}'.format(label, nodes, elapsed, rate, status))
+    return expected is None or nodes == expected
+
+
+# Check every test position against its reference counts up to max_depth. Returns True if all match.
+def run_suite(max_depth, mode='position'):
+    passed = True
+    for name, fen, counts in TEST_POSITIONS:
+        position = records.parse_fen(fen)
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            nodes, elapsed = timed(position, depth, mode)
+            passed &= _report('{} depth {}'.format(name, depth), nodes, elapsed, expected)
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count move tree leaves to check and benchmark move generation.')
+    parser.add_argument('-d', '--depth', type=int, default=6)
+    parser.add_argument('--fen', help='position to count from (default: the opening)')
+    parser.add_argument('--mode', choices=MODES, default='position', help='move generator to count with')
+    parser.add_argument('--divide', action='store_true', help='show the count below each root move')
+    parser.add_argument('--suite', action='store_true',
+                        help='check the stored test positions up to --depth against their reference counts')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        sys.exit(0 if run_suite(args.depth, args.mode) else 1)
+
+    position = records.parse_fen(args.fen) if args.fen else GameLogic().position
+    if args.divide:
+        start = time.perf_counter()
+        total = 0
+        for name, nodes in divide(position, args.depth, args.mode):
+            print('{:<16} {}'.format(name, nodes))
+            total += nodes
+        _report('total', total, time.perf_counter() - start)
+    else:
+        _report('depth {}'.format(args.depth), *timed(position, args.depth, args.mode))
+
+
+if __name__ == '__main__':
+    main()
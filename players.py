@@ -0,0 +1,160 @@
+import abc
+import concurrent.futures
+import random
+import threading
+
+import bitboard
+import search
+
+
+class PlayerType(abc.ABC):
+    @abc.abstractmethod
+    def move_made(self):
+        pass
+
+
+# Highlight the piece an AI player is about to move. Rendering is optional: headless games pass
+# graphics=None and nothing is drawn.
+def show_selection(logic, graphics, screen, pos, player):
+    if graphics is not None:
+        graphics.highlight_piece(screen, pos, logic.is_king(pos, player), player)
+
+
+# The move an opening book suggests for player, or None once the game is past book_plies or
+# the position is not in the book
+def book_move(book, book_plies, logic, player):
+    if book is None or logic.plies >= book_plies:
+        return None
+    return book.choose(logic.position.with_turn(player.value))
+
+
+# Players given a book.Book play its moves for the first book_plies plies of a game, while it has one
+class RandomPlayer(PlayerType):
+    def __init__(self, book=None, book_plies=0):
+        self.book = book
+        self.book_plies = book_plies
+        self._move_made = False
+        self.state = self.state_1
+        self._legal_moves = None
+        self._move = None
+        self._start_pos = None
+        self._end_pos = None
+
+    def move_made(self):
+        if self._move:
+            return self._move_made
+
+    def begin_move(self, logic, graphics, screen, player):
+        self.state(logic, graphics, screen, player)
+
+    def state_1(self, logic, graphics, screen, player):
+        self._legal_moves = logic.legal_moves(player)
+        self._move = book_move(self.book, self.book_plies, logic, player)
+        if self._move is None:
+            number = random.randint(0, len(self._legal_moves) - 1)
+            self._move = (self._legal_moves[number])
+        self._start_pos = bitboard.SQUARE_POS[self._move.path[0]]
+        self._end_pos = bitboard.SQUARE_POS[self._move.path[-1]]
+        self.state = self.state_2
+
+    def state_2(self, logic, graphics, screen, player):
+        show_selection(logic, graphics, screen, self._start_pos, player)
+        logic.perform_sequence(self._move)
+        self._move_made = True
+
+    def jump_state(self, logic, graphics, screen, player):
+        pass
+
+    def reset_data(self):
+        self._move_made = False
+        self.state = self.state_1
+        self._legal_moves = None
+        self._move = None
+        self._start_pos = None
+        self._end_pos = None
+
+
+# With background set, the search runs on a worker thread: begin_move starts it and returns at once,
+# and later calls poll it until the move can be played, so the caller can keep drawing meanwhile.
+class MiniMaxPlayer(PlayerType):
+    def __init__(self, time_limit=1.0, max_depth=search.MAX_PLY, verbose=True, tablebase=None, background=False,
+                 book=None, book_plies=0):
+        self.book = book
+        self.book_plies = book_plies
+        self.book_moves = 0
+        self._move_made = False
+        self.state = self.state_1
+        self._move = None
+        self._start_pos = None
+        self._future = None
+        self._stop = None
+        self.searcher = search.Searcher(time_limit, max_depth, tablebase=tablebase)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if background else None
+        self.last_search = None
+        self.total_nodes = 0
+        self.verbose = verbose
+
+    def move_made(self):
+        if self._move:
+            return self._move_made
+
+    def begin_move(self, logic, graphics, screen, player):
+        self.state(logic, graphics, screen, player)
+
+    def state_1(self, logic, graphics, screen, player):
+        self._move = book_move(self.book, self.book_plies, logic, player)
+        if self._move is not None:
+            self.book_moves += 1
+            if self.verbose:
+                print('{}: book move'.format(player.name))
+            self._start_pos = bitboard.SQUARE_POS[self._move.path[0]]
+            self.state = self.state_2
+            return
+        position = logic.position.with_turn(player.value)
+        if self.executor is None:
+            self.search_done(self.searcher.search(position), player)
+        else:
+            self._stop = threading.Event()
+            self._future = self.executor.submit(self.searcher.search, position, self._stop)
+            self.state = self.wait_state
+
+    def wait_state(self, logic, graphics, screen, player):
+        if self._future.done():
+            future, self._future = self._future, None
+            self.state = self.state_1
+            self.search_done(future.result(), player)
+
+    def search_done(self, result, player):
+        self.last_search = result
+        self.total_nodes += result.nodes
+        if self.verbose:
+            print('{}: {}'.format(player.name, result))
+        self._move = result.move
+        if self._move is not None:
+            self._start_pos = bitboard.SQUARE_POS[self._move.path[0]]
+            self.state = self.state_2
+
+    def state_2(self, logic, graphics, screen, player):
+        show_selection(logic, graphics, screen, self._start_pos, player)
+        logic.perform_sequence(self._move)
+        self._move_made = True
+
+    # Abandon a background search. A search that has already started stops within a few
+    # milliseconds and its result is dropped.
+    def cancel(self):
+        if self._future is not None:
+            if not self._future.cancel():
+                self._stop.set()
+            self._future = None
+
+    def close(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def reset_data(self):
+        self.cancel()
+        self._move_made = False
+        self.state = self.state_1
+        self._move = None
+        self._start_pos = None
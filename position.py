@@ -0,0 +1,90 @@
+import collections
+
+import bitboard
+import zobrist
+from bitboard import BLACK, RED
+
+
+# An immutable, hashable board position: the black, red and king masks, the side to move and the
+# Zobrist key of all four. Positions never change; make_move returns the child position and
+# unmake_move returns the parent. Every change a move makes is an XOR of one of its masks, so the
+# Move itself is the undo record, and the key is updated from the squares the move touched.
+class Position(collections.namedtuple('Position', ['black', 'red', 'kings', 'turn', 'zobrist'])):
+    __slots__ = ()
+
+    @classmethod
+    def from_masks(cls, black, red, kings, turn):
+        return cls(black, red, kings, turn, zobrist.full(black, red, kings, turn))
+
+    # Positions are immutable, so every game shares the one starting position
+    @classmethod
+    def initial(cls):
+        return INITIAL
+
+    def __hash__(self):
+        return self.zobrist
+
+    def pieces(self, side):
+        return self.red if side else self.black
+
+    def empty(self):
+        return ~(self.black | self.red) & bitboard.FULL
+
+    def legal_moves(self):
+        if self.turn == BLACK:
+            return bitboard.generate_moves(self.black, self.red, self.kings, BLACK)
+        return bitboard.generate_moves(self.red, self.black, self.kings, RED)
+
+    # Play a complete move from legal_moves and pass the turn
+    def make_move(self, move):
+        black, red, kings, turn, key = self
+        new_kings = kings ^ move.king_change
+        if turn == BLACK:
+            new_black = black ^ move.moved
+            new_red = red ^ move.captured
+        else:
+            new_black = black ^ move.captured
+            new_red = red ^ move.moved
+        key ^= zobrist.delta(black, red, kings, new_black, new_red, new_kings) ^ zobrist.TURN_KEY
+        return Position(new_black, new_red, new_kings, turn ^ 1, key)
+
+    # Revert the move that led to this position
+    def unmake_move(self, move):
+        black, red, kings, turn, key = self
+        old_kings = kings ^ move.king_change
+        if turn == RED:
+            old_black = black ^ move.moved
+            old_red = red ^ move.captured
+        else:
+            old_black = black ^ move.captured
+            old_red = red ^ move.moved
+        key ^= zobrist.delta(black, red, kings, old_black, old_red, old_kings) ^ zobrist.TURN_KEY
+        return Position(old_black, old_red, old_kings, turn ^ 1, key)
+
+    # Replace the masks, keeping the turn
+    def with_masks(self, black, red, kings):
+        key = self.zobrist ^ zobrist.delta(self.black, self.red, self.kings, black, red, kings)
+        return Position(black, red, kings, self.turn, key)
+
+    # Apply the masks of a (possibly partial) move for the side to move, keeping the turn
+    def toggle_pieces(self, moved, captured, king_change):
+        if self.turn == BLACK:
+            return self.with_masks(self.black ^ moved, self.red ^ captured, self.kings ^ king_change)
+        return self.with_masks(self.black ^ captured, self.red ^ moved, self.kings ^ king_change)
+
+    def with_turn(self, turn):
+        if turn == self.turn:
+            return self
+        return Position(self.black, self.red, self.kings, turn, self.zobrist ^ zobrist.TURN_KEY)
+
+    # The opponent piece jumped by moving from start_square to end_square, or 0 if it is not a capture
+    def taken_between(self, start_square, end_square):
+        side = self.turn
+        jumps = bitboard.JUMPS[side][bool(self.kings & start_square)][start_square.bit_length() - 1]
+        for taken, land, land_index in jumps:
+            if land == end_square and taken & self.pieces(side ^ 1):
+                return taken
+        return 0
+
+
+INITIAL = Position.from_masks(bitboard.BLACK_START, bitboard.RED_START, 0, BLACK)
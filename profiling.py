@@ -0,0 +1,94 @@
+import cProfile
+import functools
+import os
+import time
+
+# Opt-in call counters and timers around the engine's hot paths. Nothing is wrapped until enable()
+# is called, so there is no cost at all while instrumentation is off. Setting the CHECKERS_PROFILE
+# environment variable to anything but an empty string or 0 enables it when this module is imported.
+#
+# Times are inclusive: a begin_move that calls perform_move counts the time of both.
+
+ENV_VAR = 'CHECKERS_PROFILE'
+
+# (module, class, method) of every instrumented call
+TARGETS = (
+    ('logic', 'GameLogic', 'get_moves'),
+    ('logic', 'GameLogic', 'legal_moves'),
+    ('logic', 'GameLogic', 'is_legal'),
+    ('logic', 'GameLogic', 'check_for_take'),
+    ('logic', 'GameLogic', 'perform_move'),
+    ('logic', 'GameLogic', 'perform_sequence'),
+    ('players', 'RandomPlayer', 'begin_move'),
+    ('players', 'MiniMaxPlayer', 'begin_move'),
+    ('mcts', 'MCTSPlayer', 'begin_move'),
+    ('search', 'Searcher', 'search'),
+)
+
+# [calls, seconds] by 'Class.method'
+_stats = {}
+# The original functions that enable() replaced, by (class, method)
+_originals = {}
+
+
+def _wrap(label, function):
+    counter = _stats.setdefault(label, [0, 0.0])
+    clock = time.perf_counter
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += clock() - start
+    return timed
+
+
+def enabled():
+    return bool(_originals)
+
+
+def enable():
+    if enabled():
+        return
+    import importlib
+    for module_name, class_name, method in TARGETS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        function = cls.__dict__[method]
+        _originals[cls, method] = function
+        setattr(cls, method, _wrap('{}.{}'.format(class_name, method), function))
+
+
+def disable():
+    for (cls, method), function in _originals.items():
+        setattr(cls, method, function)
+    _originals.clear()
+
+
+def reset():
+    for counter in _stats.values():
+        counter[0] = 0
+        counter[1] = 0.0
+
+
+# Calls, total seconds and mean microseconds per call of every instrumented call made since the
+# last reset(), as a JSON-ready dict
+def summary():
+    return {label: {'calls': calls, 'seconds': round(seconds, 6),
+                    'mean_us': round(seconds / calls * 1e6, 3) if calls else 0.0}
+            for label, (calls, seconds) in sorted(_stats.items()) if calls}
+
+
+# Run function(*args) under cProfile and dump the pstats data to path
+def profile_call(path, function, *args):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(path)
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0'):
+    enable()
@@ -0,0 +1,361 @@
+import argparse
+import collections
+import re
+import struct
+
+import bitboard
+from bitboard import BLACK, RED
+from position import Position
+
+# Game records: a compact binary move-list format for storing large numbers of games, and PDN
+# import/export for exchanging them with other programs.
+#
+# Every move is written as the square it starts on and the direction of each hop: the first byte
+# holds the start square index in bits 0-4 and the direction (an index into
+# bitboard.DIRECTION_STEPS) in bits 5-6, and every further hop of a multi-jump takes one byte with
+# its direction in bits 5-6. Bit 7 is set when another hop follows. Whether a hop is a step or a
+# jump is not stored: captures are compulsory, so it follows from the position, and decoding
+# replays the game to recover full bitboard.Move tuples.
+#
+# File layout (little-endian): a header, then for each game its result, its number of moves, the
+# length of its move data and the move data itself. Games start from the standard opening position.
+
+BLACK_WIN = 0
+RED_WIN = 1
+DRAW = 2
+UNKNOWN = 3
+
+MAGIC = b'CKGR'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+GAME_HEADER = struct.Struct('<BHI')
+MORE_HOPS = 0x80
+
+# PDN results are written from the first player's side: black, who moves first, wins with "1-0".
+# Red is White in PDN tags.
+PDN_RESULTS = {BLACK_WIN: '1-0', RED_WIN: '0-1', DRAW: '1/2-1/2', UNKNOWN: '*'}
+_PDN_RESULT_CODES = {text: code for code, text in PDN_RESULTS.items()}
+_PDN_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_PDN_MOVE = re.compile(r'\d+(?:[-x]\d+)+')
+
+GameRecord = collections.namedtuple('GameRecord', ['moves', 'result', 'tags'])
+GameRecord.__new__.__defaults__ = (UNKNOWN, None)
+
+
+class RecordError(ValueError):
+    pass
+
+
+def _direction(start, end):
+    for direction, middle in enumerate(bitboard.NEIGHBOURS[start]):
+        if middle == end or (middle is not None and bitboard.NEIGHBOURS[middle][direction] == end):
+            return direction
+    raise RecordError('no hop from square {} to square {}'.format(start, end))
+
+
+def encode_move(move):
+    path = move.path
+    data = bytearray()
+    for hop in range(len(path) - 1):
+        code = _direction(path[hop], path[hop + 1]) << 5
+        if hop == 0:
+            code |= path[0]
+        if hop < len(path) - 2:
+            code |= MORE_HOPS
+        data.append(code)
+    return bytes(data)
+
+
+def encode_moves(moves):
+    return b''.join(encode_move(move) for move in moves)
+
+
+# Replay encoded move data from position, yielding each move with the position it was played from
+def _replay(data, position):
+    offset = 0
+    while offset < len(data):
+        code = data[offset]
+        offset += 1
+        moves = position.legal_moves()
+        jumping = bool(moves and moves[0].captured)
+        path = [code & 0x1F]
+        while True:
+            square = bitboard.NEIGHBOURS[path[-1]][code >> 5 & 3]
+            if square is not None and jumping:
+                square = bitboard.NEIGHBOURS[square][code >> 5 & 3]
+            if square is None:
+                raise RecordError('hop off the board from square {}'.format(path[-1]))
+            path.append(square)
+            if not code & MORE_HOPS:
+                break
+            if offset == len(data):
+                raise RecordError('move data ends in the middle of a move')
+            code = data[offset]
+            offset += 1
+        path = tuple(path)
+        for move in moves:
+            if move.path == path:
+                break
+        else:
+            raise RecordError('illegal move {}'.format(path_to_pdn(path, jumping)))
+        yield position, move
+        position = position.make_move(move)
+
+
+def decode_moves(data, position=None):
+    return [move for before, move in _replay(data, position or Position.initial())]
+
+
+# Every position of a game, starting with the one before the first move
+def positions(record, position=None):
+    position = position or Position.initial()
+    yield position
+    for move in record.moves:
+        position = position.make_move(move)
+        yield position
+
+
+# Writes games to a binary record file one at a time
+class RecordWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self.games = 0
+
+    def write(self, record):
+        data = encode_moves(record.moves)
+        self._file.write(GAME_HEADER.pack(record.result, len(record.moves), len(data)))
+        self._file.write(data)
+        self.games += 1
+
+    def close(self):
+        self._file.close()
+
+
+def write_records(path, records):
+    writer = RecordWriter(path)
+    try:
+        for record in records:
+            writer.write(record)
+    finally:
+        writer.close()
+
+
+# Yield the games of a binary record file one at a time. Only the game being decoded is held in
+# memory, so archives of any size can be streamed. With decode=False the moves are left as their
+# encoded bytes, which is much faster when only results or lengths are needed.
+def read_records(path, decode=True):
+    with open(path, 'rb') as source:
+        header = source.read(HEADER.size)
+        if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION):
+            raise RecordError('{} is not a version {} game record file'.format(path, VERSION))
+        while True:
+            header = source.read(GAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < GAME_HEADER.size:
+                raise RecordError('{} is truncated'.format(path))
+            result, count, length = GAME_HEADER.unpack(header)
+            data = source.read(length)
+            if len(data) < length:
+                raise RecordError('{} is truncated'.format(path))
+            if not decode:
+                yield GameRecord(data, result)
+                continue
+            moves = decode_moves(data)
+            if len(moves) != count:
+                raise RecordError('game has {} moves, its header says {}'.format(len(moves), count))
+            yield GameRecord(moves, result)
+
+
+# Records a game by observing a GameLogic: add recorder to logic.observers. Moves played through
+# perform_sequence arrive whole; hops played one at a time through perform_move are joined into
+# complete moves by following the jumping piece.
+class GameRecorder:
+    def __init__(self, position=None):
+        self.start = position or Position.initial()
+        self.moves = []
+        self._position = self.start
+        self._path = None
+
+    def __call__(self, before, after, path):
+        if self._path is not None and (before.turn != self._position.turn or path[0] != self._path[-1]):
+            self._finish()
+        if self._path is None:
+            self._position = before
+            self._path = list(path)
+        else:
+            self._path.extend(path[1:])
+        if len(path) > 2 or not self._continues(before, after, path):
+            self._finish()
+
+    # Whether the piece that just hopped along path can jump again, so its move is not over yet
+    def _continues(self, before, after, path):
+        side = before.turn
+        square = 1 << path[-1]
+        if before.pieces(side ^ 1) == after.pieces(side ^ 1):
+            return False
+        if after.kings & square and not before.kings & (1 << path[0]):
+            return False
+        opp = after.pieces(side ^ 1)
+        empty = after.empty()
+        return any(taken & opp and land & empty
+                   for taken, land, land_index in bitboard.JUMPS[side][bool(after.kings & square)][path[-1]])
+
+    def _finish(self):
+        path = tuple(self._path)
+        self._path = None
+        for move in self._position.legal_moves():
+            if move.path == path:
+                self.moves.append(move)
+                self._position = self._position.make_move(move)
+                return
+        raise RecordError('recorded an illegal move {}'.format(path))
+
+    def record(self, result=UNKNOWN, tags=None):
+        if self._path is not None:
+            self._finish()
+        return GameRecord(list(self.moves), result, tags)
+
+
+# A position in PDN FEN notation, e.g. "B:W21,22,K30:B1,K5" (side to move, then each side's
+# pieces by square number, kings marked K). Black is B and red is W.
+def to_fen(position):
+    fields = []
+    for side, letter in ((RED, 'W'), (BLACK, 'B')):
+        squares = ['{}{}'.format('K' if position.kings & square else '', bitboard.index_of(square) + 1)
+                   for square in bitboard.iter_bits(position.pieces(side))]
+        fields.append(letter + ','.join(squares))
+    return '{}:{}'.format('W' if position.turn == RED else 'B', ':'.join(fields))
+
+
+def parse_fen(text):
+    fields = text.strip().strip('"').rstrip('.').split(':')
+    if len(fields) != 3 or fields[0].upper() not in ('B', 'W'):
+        raise RecordError('bad FEN {!r}'.format(text))
+    masks = {'B': 0, 'W': 0}
+    kings = 0
+    for field in fields[1:]:
+        letter = field[:1].upper()
+        if letter not in masks:
+            raise RecordError('bad FEN {!r}'.format(text))
+        for square in filter(None, (part.strip() for part in field[1:].split(','))):
+            king = square[:1].upper() == 'K'
+            if king:
+                square = square[1:]
+            if not square.isdigit() or not 1 <= int(square) <= 32:
+                raise RecordError('bad square {!r} in FEN {!r}'.format(square, text))
+            masks[letter] |= 1 << int(square) - 1
+            if king:
+                kings |= 1 << int(square) - 1
+    if masks['B'] & masks['W']:
+        raise RecordError('square on both sides in FEN {!r}'.format(text))
+    turn = RED if fields[0].upper() == 'W' else BLACK
+    return Position.from_masks(masks['B'], masks['W'], kings, turn)
+
+
+def path_to_pdn(path, captures):
+    return ('x' if captures else '-').join(str(index + 1) for index in path)
+
+
+# A game as PDN text. tags are written after the standard ones; red plays under the White tag.
+def to_pdn(record, tags=None):
+    header = collections.OrderedDict([('GameType', '21'), ('Black', '?'), ('White', '?')])
+    header.update(record.tags or {})
+    header.update(tags or {})
+    header['Result'] = PDN_RESULTS[record.result]
+    lines = ['[{} "{}"]'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+             for name, value in header.items()]
+    words = []
+    for number, move in enumerate(record.moves):
+        if number % 2 == 0:
+            words.append('{}.'.format(number // 2 + 1))
+        words.append(path_to_pdn(move.path, move.captured))
+    words.append(header['Result'])
+    text = []
+    line = ''
+    for word in words:
+        if line and len(line) + len(word) >= 80:
+            text.append(line)
+            line = word
+        else:
+            line = '{} {}'.format(line, word) if line else word
+    text.append(line)
+    return '\n'.join(lines) + '\n\n' + '\n'.join(text) + '\n'
+
+
+def write_pdn(path, records):
+    with open(path, 'w') as out:
+        for record in records:
+            out.write(to_pdn(record))
+            out.write('\n')
+
+
+# Moves of PDN movetext, matched against the legal moves of each position. A jump may be written
+# with only its first and last squares when that is unambiguous.
+def parse_pdn_moves(text, position=None):
+    position = position or Position.initial()
+    text = re.sub(r'\{[^}]*\}|\([^)]*\)|;[^\n]*', ' ', text)
+    moves = []
+    for word in _PDN_MOVE.findall(text):
+        squares = [int(number) - 1 for number in re.split('[-x]', word)]
+        matches = [move for move in position.legal_moves()
+                   if move.path == tuple(squares)
+                   or (move.path[0] == squares[0] and move.path[-1] == squares[-1] and len(squares) == 2)]
+        if len(matches) != 1:
+            raise RecordError('{} move {} in movetext'.format('ambiguous' if matches else 'illegal', word))
+        moves.append(matches[0])
+        position = position.make_move(matches[0])
+    return moves
+
+
+def _parse_pdn_game(tags, movetext):
+    body = ' '.join(movetext)
+    result = tags.get('Result')
+    for text, code in _PDN_RESULT_CODES.items():
+        if body.rstrip().endswith(text):
+            body = body.rstrip()[:-len(text)]
+            if result is None:
+                result = text
+            break
+    if 'FEN' in tags:
+        raise RecordError('PDN games from a set-up position are not supported')
+    return GameRecord(parse_pdn_moves(body), _PDN_RESULT_CODES.get(result, UNKNOWN), tags)
+
+
+# Yield the games of a PDN file one at a time, reading it line by line
+def read_pdn(path):
+    with open(path) as source:
+        tags = {}
+        movetext = []
+        for line in source:
+            stripped = line.strip()
+            if stripped.startswith('['):
+                if movetext:
+                    yield _parse_pdn_game(tags, movetext)
+                    tags = {}
+                    movetext = []
+                for name, value in _PDN_TAG.findall(stripped):
+                    tags[name] = re.sub(r'\\(.)', r'\1', value)
+            elif stripped:
+                movetext.append(stripped)
+        if movetext:
+            yield _parse_pdn_game(tags, movetext)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert game records between the binary format and PDN.')
+    parser.add_argument('source', help='a .pdn file, or a binary game record file')
+    parser.add_argument('output', help='a .pdn file, or a binary game record file')
+    args = parser.parse_args(argv)
+
+    games = read_pdn(args.source) if args.source.endswith('.pdn') else read_records(args.source)
+    if args.output.endswith('.pdn'):
+        write_pdn(args.output, games)
+    else:
+        write_records(args.output, games)
+
+
+if __name__ == '__main__':
+    main()
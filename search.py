@@ -0,0 +1,221 @@
+import collections
+import time
+
+import tablebase
+import transposition
+from bitboard import BLACK
+from transposition import EXACT, LOWER, UPPER
+
+try:
+    import evaluator
+except ImportError:
+    evaluator = None
+
+MAN_VALUE = 100
+KING_VALUE = 160
+WIN_SCORE = 100000
+MAX_PLY = 128
+# Scores this close to WIN_SCORE are wins or losses, by search or from the tablebase
+WIN_RANGE = 20000
+INFINITY = WIN_SCORE + 1
+
+
+class SearchResult(collections.namedtuple('SearchResult', ['move', 'score', 'depth', 'nodes', 'elapsed'])):
+    __slots__ = ()
+
+    @property
+    def nodes_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.nodes / self.elapsed
+
+    def __str__(self):
+        return 'depth {}, {} nodes in {:.2f}s ({:.0f} nodes/s), score {}'.format(
+            self.depth, self.nodes, self.elapsed, self.nodes_per_second, self.score)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# Static evaluation from the point of view of the side to move: material only. The search scores its
+# leaves with this, not with the features of evaluator.py.
+def evaluate(position):
+    black, red, kings, turn, key = position
+    score = (MAN_VALUE * ((black & ~kings).bit_count() - (red & ~kings).bit_count())
+             + KING_VALUE * ((black & kings).bit_count() - (red & kings).bit_count()))
+    return score if turn == BLACK else -score
+
+
+# Negamax alpha-beta search with iterative deepening under a wall-clock budget. Capture sequences
+# are searched past the nominal depth so that leaves are never scored in the middle of an exchange.
+# Results are kept in a transposition table of table_mb megabytes that persists between moves.
+# When a tablebase.Tablebase is given, positions with few enough pieces are scored from it exactly.
+class Searcher:
+    def __init__(self, time_limit=1.0, max_depth=MAX_PLY, table_mb=transposition.DEFAULT_SIZE_MB,
+                 tablebase=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.table = transposition.TranspositionTable(table_mb)
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.deadline = None
+        self._stop = None
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+
+    # stop, if given, is a threading.Event that ends the search within the next 1024 nodes once set,
+    # returning the best move of the last depth completed. It belongs to the caller, so setting it
+    # before the search gets going (on another thread, say) still stops it.
+    # A position with a single legal move is answered at once with a score of 0, unless score_forced
+    # is set, in which case it is searched like any other to give it a real score.
+    def search(self, position, stop=None, score_forced=False):
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit
+        self._stop = stop
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {key: value // 2 for key, value in self.history.items() if value > 1}
+        self.table.new_search()
+
+        moves = position.legal_moves()
+        if not moves:
+            return SearchResult(None, -WIN_SCORE, 0, 0, 0.0)
+        if len(moves) == 1 and not score_forced:
+            return SearchResult(moves[0], 0, 0, 0, time.perf_counter() - start)
+
+        if evaluator is not None:
+            # Score every reply in one batch so the first iteration starts with the most promising move.
+            # This only orders the root moves: leaves are scored one at a time by evaluate(), as batches
+            # the size of a node's replies cost far more in NumPy call overhead than they save.
+            scores = evaluator.evaluate_positions([position.make_move(move) for move in moves])
+            moves = [moves[index] for index in sorted(range(len(moves)), key=scores.__getitem__)]
+
+        best_move = moves[0]
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best_score, best_move = self._root(position, moves, depth, best_move)
+            except SearchTimeout:
+                break
+            depth_reached = depth
+            if abs(best_score) >= WIN_SCORE - WIN_RANGE:
+                break
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, time.perf_counter() - start)
+
+    def _root(self, position, moves, depth, best_move):
+        alpha = -INFINITY
+        for move in self._order(moves, position.turn, 0, best_move):
+            score = -self._negamax(position.make_move(move), depth - 1, -INFINITY, -alpha, 1)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and (time.perf_counter() > self.deadline or
+                                      self._stop is not None and self._stop.is_set()):
+            raise SearchTimeout()
+
+        if self.tablebase is not None:
+            known = self.tablebase.probe(position)
+            if known is not None:
+                result, distance = known
+                if result == tablebase.WIN:
+                    return WIN_SCORE - ply - distance
+                if result == tablebase.LOSS:
+                    return ply + distance - WIN_SCORE
+                return 0
+
+        key = position.zobrist
+        entry = self.table.probe(key)
+        hash_code = None
+        if entry is not None:
+            hash_code = entry.move_code
+            if entry.depth >= depth:
+                score = _score_from_table(entry.score, ply)
+                if entry.bound == EXACT:
+                    return score
+                if entry.bound == LOWER and score >= beta:
+                    return score
+                if entry.bound == UPPER and score <= alpha:
+                    return score
+
+        moves = position.legal_moves()
+        if not moves:
+            return ply - WIN_SCORE
+        if (depth <= 0 and not moves[0].captured) or ply >= MAX_PLY:
+            return evaluate(position)
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = None
+        first = transposition.find_move(moves, hash_code) if hash_code is not None else None
+        for move in self._order(moves, position.turn, ply, first):
+            score = -self._negamax(position.make_move(move), depth - 1, -beta, -alpha, ply + 1)
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not move.captured:
+                            self._record_cutoff(move, position.turn, depth, ply)
+                        break
+
+        if best >= beta:
+            bound = LOWER
+        elif best <= original_alpha:
+            bound = UPPER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, bound, _score_to_table(best, ply), transposition.move_code(best_move))
+        return best
+
+    # Captures first (they are compulsory, so a position has either all captures or none), biggest first.
+    # Quiet moves go killers first, then by history score.
+    def _order(self, moves, turn, ply, first=None):
+        if len(moves) > 1:
+            if moves[0].captured:
+                moves = sorted(moves, key=lambda move: move.captured.bit_count(), reverse=True)
+            else:
+                killers = self.killers[ply]
+                history = self.history
+
+                def score(move):
+                    if move == killers[0] or move == killers[1]:
+                        return 1 << 30
+                    return history.get((turn, move.path[0], move.path[-1]), 0)
+                moves = sorted(moves, key=score, reverse=True)
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _record_cutoff(self, move, turn, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (turn, move.path[0], move.path[-1])
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+# Win and loss scores are stored relative to the node rather than the root, so they stay correct
+# when the same position is reached at a different ply.
+def _score_to_table(score, ply):
+    if score >= WIN_SCORE - WIN_RANGE:
+        return score + ply
+    if score <= WIN_RANGE - WIN_SCORE:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score >= WIN_SCORE - WIN_RANGE:
+        return score - ply
+    if score <= WIN_RANGE - WIN_SCORE:
+        return score + ply
+    return score
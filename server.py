@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import math
+import random
+import sys
+
+import bitboard
+import headless
+import records
+import search
+from logic import GameLogic, Outcome, Player
+from position import Position
+
+# A game server hosting many games at once in one asyncio process. Clients talk to it in JSON lines
+# over TCP or a Unix socket: one request object per line, answered by one response object per line,
+# in order. A request's "id", if given, is echoed in its response.
+#
+# Requests, by "op":
+#   new     start a game. "opponent" is "random", "minimax", "mcts" or null (two players share the
+#           game); "color" is the side the client plays against an AI, "black" (default) or "red";
+#           "time_limit" is the AI's seconds per move, more than 0 and at most 10.
+#   move    play "move" in PDN notation with every square of a jump ("11-15", "15x24x31") in
+#           "game" for the side to move. If the opponent is an AI, its reply is played before the
+#           response is sent.
+#   state   the current state of "game"
+#   close   end "game" and forget it
+#
+# Every game response holds the game id, the position as PDN FEN, the side to move, the legal moves
+# in PDN notation, the status ("playing", "black", "red" or "draw") and, after an AI move, "reply".
+# Errors are answered with {"ok": false, "error": ...}.
+#
+# Sessions hold only a GameLogic and a few fields. AI moves are computed in a process pool, so a
+# slow search never blocks the other games.
+
+AI_TYPES = ('random', 'minimax', 'mcts')
+DEFAULT_TIME_LIMIT = 0.1
+MAX_TIME_LIMIT = 10.0
+DEFAULT_PORT = 8765
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Session:
+    __slots__ = ('logic', 'opponent', 'ai_side', 'time_limit', 'lock')
+
+    def __init__(self, opponent, ai_side, time_limit):
+        self.logic = GameLogic()
+        self.opponent = opponent
+        self.ai_side = ai_side
+        self.time_limit = time_limit
+        # Serialises the moves of clients sharing the game
+        self.lock = asyncio.Lock()
+
+    def status(self):
+        logic = self.logic
+        outcome = logic.game_over()
+        if outcome == Outcome.DRAW or (outcome is None and logic.plies >= headless.MAX_PLIES):
+            return 'draw'
+        if outcome is not None:
+            return Player(outcome.value).name.lower()
+        return 'playing'
+
+
+# The searcher of this worker process, kept so its transposition table stays warm between requests.
+# There is only one, whatever time limits the games ask for, so a worker's memory stays bounded.
+_searcher = None
+
+
+# Choose a move in a worker process. Returns the move's path.
+def ai_move(opponent, masks, time_limit, seed):
+    global _searcher
+    position = Position.from_masks(*masks)
+    if opponent == 'random':
+        moves = position.legal_moves()
+        return random.Random(seed).choice(moves).path
+    if opponent == 'minimax':
+        if _searcher is None:
+            _searcher = search.Searcher(time_limit)
+        _searcher.time_limit = time_limit
+        return _searcher.search(position).move.path
+    import mcts
+    return mcts.MCTS(processes=1, seed=seed).search(position, time_limit=time_limit).move.path
+
+
+# The legal move of the side to move written as text. Every hop is checked with is_legal on the way,
+# then the whole path against the legal moves, which enforces compulsory and complete captures.
+def _parse_move(logic, text):
+    if not isinstance(text, str):
+        raise ProtocolError('move must be a string such as "11-15"')
+    try:
+        squares = [int(number) - 1 for number in text.replace('x', '-').split('-')]
+    except ValueError:
+        raise ProtocolError('bad move {!r}'.format(text))
+    if len(squares) < 2 or not all(0 <= square < 32 for square in squares):
+        raise ProtocolError('bad move {!r}'.format(text))
+    hops = GameLogic()
+    hops.position = logic.position
+    for start, end in zip(squares, squares[1:]):
+        start_pos, end_pos = bitboard.SQUARE_POS[start], bitboard.SQUARE_POS[end]
+        if not hops.is_legal(start_pos, end_pos):
+            raise ProtocolError('illegal hop {}-{}'.format(start + 1, end + 1))
+        hops.perform_move(start_pos, end_pos)
+    for move in logic.legal_moves(logic.player_turn):
+        if move.path == tuple(squares):
+            return move
+    raise ProtocolError('illegal move {!r}'.format(text))
+
+
+def _move_name(move):
+    return records.path_to_pdn(move.path, move.captured)
+
+
+class GameServer:
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self.moves = 0
+
+    def _game(self, request):
+        session = self.sessions.get(request.get('game'))
+        if session is None:
+            raise ProtocolError('no game {!r}'.format(request.get('game')))
+        return session
+
+    def _describe(self, game_id, session, reply=None):
+        logic = session.logic
+        status = session.status()
+        moves = logic.legal_moves(logic.player_turn) if status == 'playing' else []
+        response = {
+            'ok': True,
+            'game': game_id,
+            'fen': records.to_fen(logic.position),
+            'turn': logic.player_turn.name.lower(),
+            'status': status,
+            'moves': [_move_name(move) for move in moves],
+        }
+        if reply is not None:
+            response['reply'] = reply
+        return response
+
+    def _play(self, session, move):
+        logic = session.logic
+        logic.perform_sequence(move)
+        logic.set_take_made(False)
+        logic.change_player(logic.next_player())
+        self.moves += 1
+
+    # Let the AI move if it is its turn. Returns the move played, in PDN notation, or None. If the AI
+    # fails, a random legal move is played instead, so the game can always go on.
+    async def _ai_turn(self, session):
+        logic = session.logic
+        if session.opponent is None or logic.player_turn != session.ai_side or session.status() != 'playing':
+            return None
+        moves = logic.legal_moves(logic.player_turn)
+        task = (session.opponent, logic.position[:4], session.time_limit, random.getrandbits(32))
+        try:
+            if self.executor is None:
+                path = ai_move(*task)
+            else:
+                path = await asyncio.get_running_loop().run_in_executor(self.executor, ai_move, *task)
+            move = next(move for move in moves if move.path == path)
+        except Exception as error:
+            print('{} AI failed ({!r}), playing a random move'.format(session.opponent, error), file=sys.stderr)
+            move = random.choice(moves)
+        self._play(session, move)
+        return _move_name(move)
+
+    async def new(self, request):
+        opponent = request.get('opponent')
+        if opponent is not None and opponent not in AI_TYPES:
+            raise ProtocolError('unknown opponent {!r}'.format(opponent))
+        color = request.get('color', 'black')
+        if color not in ('black', 'red'):
+            raise ProtocolError('color must be "black" or "red"')
+        time_limit = float(request.get('time_limit', DEFAULT_TIME_LIMIT))
+        if not math.isfinite(time_limit) or not 0 < time_limit <= MAX_TIME_LIMIT:
+            raise ProtocolError('time_limit must be more than 0 and at most {}'.format(MAX_TIME_LIMIT))
+        ai_side = Player.RED if color == 'black' else Player.BLACK
+        session = Session(opponent, ai_side, time_limit)
+        game_id = next(self._ids)
+        self.sessions[game_id] = session
+        async with session.lock:
+            reply = await self._ai_turn(session)
+            return self._describe(game_id, session, reply)
+
+    async def move(self, request):
+        session = self._game(request)
+        async with session.lock:
+            if session.status() != 'playing':
+                raise ProtocolError('the game is over')
+            if session.opponent is not None and session.logic.player_turn == session.ai_side:
+                raise ProtocolError('it is the AI\'s turn')
+            self._play(session, _parse_move(session.logic, request.get('move')))
+            reply = await self._ai_turn(session)
+            return self._describe(request['game'], session, reply)
+
+    async def state(self, request):
+        return self._describe(request.get('game'), self._game(request))
+
+    async def close(self, request):
+        self._game(request)
+        del self.sessions[request['game']]
+        return {'ok': True, 'game': request['game']}
+
+    async def handle(self, request):
+        if not isinstance(request, dict):
+            raise ProtocolError('a request must be a JSON object')
+        op = request.get('op')
+        if op not in ('new', 'move', 'state', 'close'):
+            raise ProtocolError('unknown op {!r}'.format(op))
+        return await getattr(self, op)(request)
+
+    async def _respond(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return {'ok': False, 'error': str(error)}
+        try:
+            response = await self.handle(request)
+        except (ProtocolError, ValueError, TypeError) as error:
+            response = {'ok': False, 'error': str(error)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                writer.write(json.dumps(await self._respond(line)).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, workers=None):
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        game_server = GameServer(executor)
+        if unix_path:
+            server = await asyncio.start_unix_server(game_server.serve_client, unix_path)
+        else:
+            server = await asyncio.start_server(game_server.serve_client, host, port)
+        print('serving on {}'.format(unix_path or '{}:{}'.format(host, port)), file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host checkers games over a JSON lines protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('-j', '--workers', type=int, help='AI worker processes (default: one per core)')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+import argparse
+import array
+import collections
+import itertools
+import mmap
+import struct
+import sys
+import time
+
+import bitboard
+from bitboard import BLACK, RED
+from position import Position
+
+# Endgame tablebases built by retrograde analysis over the GameLogic rules.
+#
+# Positions are grouped by material signature (black men, black kings, red men, red kings). Inside
+# a signature a position is indexed by ranking each group of pieces among the squares left for it,
+# black men first, then red men, black kings and red kings, with the side to move as the lowest bit.
+# Each entry is a 16-bit word: result << 14 | distance, where distance counts plies to the end of
+# the game under best play. A zero word marks an index that no legal position maps to.
+#
+# File layout (little-endian): a header, one directory entry per signature, then the entries of
+# every signature back to back. Tables are memory-mapped when loaded, so probing never reads a
+# table into the heap. Generation lays the whole file out first and solves each signature straight
+# into its place in a mapping of it, so only the working arrays of one signature are ever held.
+
+WIN = 1
+LOSS = 2
+DRAW = 3
+
+MAGIC = b'CKTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+DIRECTORY_ENTRY = struct.Struct('<4BQQ')
+MAX_DISTANCE = 0x3FFF
+# Every legal position starts out a draw and keeps that entry unless it is resolved as a win or a loss
+UNDECIDED = DRAW << 14
+# remaining count of a position that has a move which does not lose, so it can never be lost
+CANNOT_LOSE = 0xFF
+
+BLACK_MAN_SQUARES = bitboard.FULL & ~bitboard.PROMOTION_ROW[BLACK]
+RED_MAN_SQUARES = bitboard.FULL & ~bitboard.PROMOTION_ROW[RED]
+BINOMIAL = [[0] * 33 for _ in range(33)]
+for _n in range(33):
+    BINOMIAL[_n][0] = 1
+    for _k in range(1, _n + 1):
+        BINOMIAL[_n][_k] = BINOMIAL[_n - 1][_k - 1] + BINOMIAL[_n - 1][_k]
+
+
+# Colex rank of a set of squares among the squares of domain
+def _rank(subset, domain):
+    rank = 0
+    count = 1
+    while subset:
+        low = subset & -subset
+        subset ^= low
+        rank += BINOMIAL[(domain & (low - 1)).bit_count()][count]
+        count += 1
+    return rank
+
+
+# The set of count squares of domain with colex rank rank: the inverse of _rank
+def _unrank(rank, count, domain):
+    squares = list(bitboard.iter_bits(domain))
+    subset = 0
+    for k in range(count, 0, -1):
+        c = k - 1
+        while BINOMIAL[c + 1][k] <= rank:
+            c += 1
+        rank -= BINOMIAL[c][k]
+        subset |= squares[c]
+    return subset
+
+
+def signature_of(position):
+    black, red, kings = position.black, position.red, position.kings
+    return ((black & ~kings).bit_count(), (black & kings).bit_count(),
+            (red & ~kings).bit_count(), (red & kings).bit_count())
+
+
+def signature_size(signature):
+    black_men, black_kings, red_men, red_kings = signature
+    free = 32 - black_men - red_men
+    return (BINOMIAL[28][black_men] * BINOMIAL[28][red_men] * BINOMIAL[free][black_kings]
+            * BINOMIAL[free - black_kings][red_kings] * 2)
+
+
+def position_index(position):
+    return masks_index(position.black, position.red, position.kings, position.turn)
+
+
+def masks_index(black, red, kings, turn):
+    black_men = black & ~kings
+    red_men = red & ~kings
+    black_kings = black & kings
+    red_kings = red & kings
+    free = bitboard.FULL & ~(black_men | red_men)
+    rest = free & ~black_kings
+    index = _rank(black_men, BLACK_MAN_SQUARES)
+    index = index * BINOMIAL[28][red_men.bit_count()] + _rank(red_men, RED_MAN_SQUARES)
+    index = index * BINOMIAL[free.bit_count()][black_kings.bit_count()] + _rank(black_kings, free)
+    index = index * BINOMIAL[rest.bit_count()][red_kings.bit_count()] + _rank(red_kings, rest)
+    return index * 2 + turn
+
+
+# The (black, red, kings, turn) masks of the position at index in signature: the inverse of masks_index
+def index_masks(signature, index):
+    black_men, black_kings, red_men, red_kings = signature
+    free_count = 32 - black_men - red_men
+    turn = index & 1
+    index, red_king_rank = divmod(index >> 1, BINOMIAL[free_count - black_kings][red_kings])
+    index, black_king_rank = divmod(index, BINOMIAL[free_count][black_kings])
+    black_man_rank, red_man_rank = divmod(index, BINOMIAL[28][red_men])
+    black_man_mask = _unrank(black_man_rank, black_men, BLACK_MAN_SQUARES)
+    red_man_mask = _unrank(red_man_rank, red_men, RED_MAN_SQUARES)
+    free = bitboard.FULL & ~(black_man_mask | red_man_mask)
+    black_king_mask = _unrank(black_king_rank, black_kings, free)
+    red_king_mask = _unrank(red_king_rank, red_kings, free & ~black_king_mask)
+    return (black_man_mask | black_king_mask, red_man_mask | red_king_mask, black_king_mask | red_king_mask,
+            turn)
+
+
+# Every signature with pieces on both sides and at most max_pieces in total, ordered so that every
+# signature a move can lead to (by capture or crowning) comes before the one it is played from
+def signatures(max_pieces):
+    result = []
+    for black in range(1, max_pieces):
+        for red in range(1, max_pieces - black + 1):
+            for black_kings in range(black + 1):
+                for red_kings in range(red + 1):
+                    result.append((black - black_kings, black_kings, red - red_kings, red_kings))
+    result.sort(key=lambda signature: (sum(signature), signature[0] + signature[2]))
+    return result
+
+
+def _combinations(squares, count):
+    for chosen in itertools.combinations(list(bitboard.iter_bits(squares)), count):
+        yield sum(chosen)
+
+
+def _positions(signature):
+    black_men, black_kings, red_men, red_kings = signature
+    for black_mask in _combinations(BLACK_MAN_SQUARES, black_men):
+        for red_mask in _combinations(RED_MAN_SQUARES & ~black_mask, red_men):
+            free = bitboard.FULL & ~(black_mask | red_mask)
+            for black_king_mask in _combinations(free, black_kings):
+                for red_king_mask in _combinations(free & ~black_king_mask, red_kings):
+                    black = black_mask | black_king_mask
+                    red = red_mask | red_king_mask
+                    kings = black_king_mask | red_king_mask
+                    for turn in (BLACK, RED):
+                        yield Position.from_masks(black, red, kings, turn)
+
+
+# The positions of the same signature from which the side that just moved could have reached this
+# one with a simple move, as (black, red, kings, turn) masks. Captures and crownings always change
+# the signature, so they are never among them. A step is skipped if the position before it had a
+# capture, which would have been forced.
+def _predecessors(black, red, kings, turn):
+    mover = turn ^ 1
+    own, opp = (red, black) if mover else (black, red)
+    empty = ~(black | red) & bitboard.FULL
+    pieces = own
+    while pieces:
+        target = pieces & -pieces
+        pieces ^= target
+        is_king = bool(kings & target)
+        # A man came from behind it: one of the squares a man of the other side could step to
+        sources = bitboard.STEPS[mover][True] if is_king else bitboard.STEPS[mover ^ 1][False]
+        for source, source_index in sources[target.bit_length() - 1]:
+            if not source & empty:
+                continue
+            moved = source | target
+            new_own = own ^ moved
+            new_kings = kings ^ moved if is_king else kings
+            if bitboard.jumpers(new_own, opp, new_kings, empty ^ moved, mover):
+                continue
+            if mover == BLACK:
+                yield new_own, opp, new_kings, BLACK
+            else:
+                yield opp, new_own, new_kings, RED
+
+
+def _lookup(tables, position):
+    if not position.pieces(position.turn):
+        return LOSS, 0
+    entry = tables[signature_of(position)][position_index(position)]
+    return entry >> 14, entry & MAX_DISTANCE
+
+
+# Solve one signature into values, its zero-filled table, given the tables of every signature its
+# moves can leave to. Positions are resolved in order of distance: a position is won as soon as one
+# move reaches a lost position, and lost once every move reaches a won one. Whatever is never
+# resolved is a draw. Positions waiting to be resolved are kept as index << 1 | won, and the
+# working arrays take three bytes a position.
+def _solve(signature, tables, values):
+    size = signature_size(signature)
+    # Moves to positions of this signature not yet known to be won, or CANNOT_LOSE
+    remaining = bytearray(size)
+    longest = array.array('H', bytes(2 * size))
+    buckets = collections.defaultdict(lambda: array.array('Q'))
+
+    for position in _positions(signature):
+        index = position_index(position)
+        values[index] = UNDECIDED
+        moves = position.legal_moves()
+        internal = 0
+        shortest_win = None
+        longest_loss = 0
+        cannot_lose = False
+        for move in moves:
+            child = position.make_move(move)
+            if signature_of(child) == signature:
+                internal += 1
+                continue
+            result, distance = _lookup(tables, child)
+            if result == LOSS:
+                if shortest_win is None or distance + 1 < shortest_win:
+                    shortest_win = distance + 1
+            elif result == WIN:
+                longest_loss = max(longest_loss, distance + 1)
+            else:
+                cannot_lose = True
+        remaining[index] = CANNOT_LOSE if cannot_lose or shortest_win is not None else internal
+        longest[index] = longest_loss
+        if shortest_win is not None:
+            buckets[shortest_win].append(index << 1 | 1)
+        elif not internal and not cannot_lose:
+            buckets[longest_loss].append(index << 1)
+
+    distance = 0
+    while buckets:
+        for entry in buckets.pop(distance, ()):
+            index = entry >> 1
+            if values[index] != UNDECIDED:
+                continue
+            result = WIN if entry & 1 else LOSS
+            values[index] = result << 14 | min(distance, MAX_DISTANCE)
+            for previous in _predecessors(*index_masks(signature, index)):
+                previous_index = masks_index(*previous)
+                if values[previous_index] != UNDECIDED:
+                    continue
+                if result == LOSS:
+                    buckets[distance + 1].append(previous_index << 1 | 1)
+                    continue
+                if remaining[previous_index] == CANNOT_LOSE:
+                    continue
+                remaining[previous_index] -= 1
+                longest[previous_index] = max(longest[previous_index], distance + 1)
+                if not remaining[previous_index]:
+                    buckets[longest[previous_index]].append(previous_index << 1)
+        distance += 1
+
+
+def generate(max_pieces, path, log=None):
+    order = signatures(max_pieces)
+    offset = HEADER.size + DIRECTORY_ENTRY.size * len(order)
+    directory = []
+    for signature in order:
+        directory.append((signature, offset, signature_size(signature)))
+        offset += 2 * directory[-1][2]
+
+    with open(path, 'w+b') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, max_pieces, len(order)))
+        for signature, start, size in directory:
+            out.write(DIRECTORY_ENTRY.pack(*signature, start, size))
+        # Extended with zeros, which most file systems store sparsely until written
+        out.truncate(offset)
+        out.flush()
+        with mmap.mmap(out.fileno(), offset) as mapped:
+            view = memoryview(mapped)
+            tables = {}
+            try:
+                for signature, start, size in directory:
+                    started = time.perf_counter()
+                    tables[signature] = view[start:start + 2 * size].cast('H')
+                    _solve(signature, tables, tables[signature])
+                    # Write the finished table out, so its pages can leave memory
+                    mapped.flush()
+                    if log is not None:
+                        print('solved {} ({} entries) in {:.1f}s'.format(signature, size,
+                                                                         time.perf_counter() - started), file=log)
+            finally:
+                for table in tables.values():
+                    table.release()
+                view.release()
+
+
+# A tablebase file opened for probing. The file is memory-mapped and each signature's entries are
+# read in place through a memoryview.
+class Tablebase:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._tables = {}
+        magic, version, self.max_pieces, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} tablebase file'.format(path, VERSION))
+        view = memoryview(self._map)
+        for number in range(count):
+            entry = DIRECTORY_ENTRY.unpack_from(self._map, HEADER.size + number * DIRECTORY_ENTRY.size)
+            offset, size = entry[4:]
+            self._tables[entry[:4]] = view[offset:offset + 2 * size].cast('H')
+        view.release()
+
+    # (result, distance) for the side to move, or None if the position has too many pieces
+    def probe(self, position):
+        black, red = position.black, position.red
+        if (black | red).bit_count() > self.max_pieces:
+            return None
+        if not position.pieces(position.turn):
+            return LOSS, 0
+        if not position.pieces(position.turn ^ 1):
+            return WIN, 0
+        table = self._tables.get(signature_of(position))
+        if table is None:
+            return None
+        entry = table[position_index(position)]
+        if not entry:
+            return None
+        return entry >> 14, entry & MAX_DISTANCE
+
+    def close(self):
+        for table in self._tables.values():
+            table.release()
+        self._tables = {}
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate an endgame tablebase.')
+    parser.add_argument('output')
+    parser.add_argument('-n', '--pieces', type=int, default=4, help='maximum number of pieces on the board')
+    args = parser.parse_args(argv)
+    generate(args.pieces, args.output, log=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
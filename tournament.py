@@ -0,0 +1,193 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import pstats
+import random
+import sys
+import time
+
+import headless
+import mcts
+import profiling
+import records
+import search
+from bitboard import BLACK
+from logic import GameLogic
+from players import MiniMaxPlayer, RandomPlayer
+
+PLAYER_TYPES = ('random', 'minimax', 'mcts')
+
+# Options shared by every game of a tournament
+Settings = collections.namedtuple('Settings', ['time_limit', 'max_depth', 'max_plies', 'eval_trace', 'tablebase',
+                                               'record', 'book', 'book_plies', 'instrument', 'profile_dir'])
+DEFAULT_SETTINGS = Settings(0.1, search.MAX_PLY, headless.MAX_PLIES, False, None, False, None, 0, False, None)
+
+# Tablebases and opening books opened by this worker process, by path. The files are memory-mapped,
+# so every worker shares the same pages.
+_opened = {}
+
+
+def _open_tablebase(path):
+    if path is None:
+        return None
+    if path not in _opened:
+        import tablebase
+        _opened[path] = tablebase.Tablebase(path)
+    return _opened[path]
+
+
+def _open_book(path):
+    if path is None:
+        return None
+    if path not in _opened:
+        import book
+        _opened[path] = book.Book(path)
+    return _opened[path]
+
+
+def make_player(name, settings=DEFAULT_SETTINGS):
+    opening_book = _open_book(settings.book)
+    if name == 'random':
+        return RandomPlayer(book=opening_book, book_plies=settings.book_plies)
+    if name == 'minimax':
+        return MiniMaxPlayer(time_limit=settings.time_limit, max_depth=settings.max_depth, verbose=False,
+                             tablebase=_open_tablebase(settings.tablebase), book=opening_book,
+                             book_plies=settings.book_plies)
+    if name == 'mcts':
+        # Games already run one per worker process, so the playouts stay in this process
+        return mcts.MCTSPlayer(time_limit=settings.time_limit, processes=1, seed=random.getrandbits(32),
+                               verbose=False, book=opening_book, book_plies=settings.book_plies)
+    raise ValueError('Unknown player type: {}'.format(name))
+
+
+# Play a single game in a worker process. random is seeded from the game's own seed, so a game
+# replays identically whichever worker runs it and in whatever order.
+# With eval_trace, the record also holds the static evaluation (from black's side) of every position
+# of the game, scored in a single batch. With record, it holds the game's moves in the game record
+# encoding, as hex. With instrument (or CHECKERS_PROFILE set), it holds the profiling summary of the
+# game, and with profile_dir the game is run under cProfile and its stats saved there.
+def play_one(task):
+    index, seed, black_name, red_name, settings = task
+    random.seed(seed)
+    black = make_player(black_name, settings)
+    red = make_player(red_name, settings)
+    history = [] if settings.eval_trace else None
+    logic = GameLogic()
+    recorder = records.GameRecorder()
+    if settings.record:
+        logic.observers.append(recorder)
+    if settings.instrument:
+        profiling.enable()
+    profiling.reset()
+    start = time.perf_counter()
+    if settings.profile_dir:
+        result = profiling.profile_call(profile_path(settings.profile_dir, index), headless.play_game, black, red,
+                                        settings.max_plies, logic, history)
+    else:
+        result = headless.play_game(black, red, settings.max_plies, logic=logic, history=history)
+    duration = time.perf_counter() - start
+    record = {
+        'game': index,
+        'seed': seed,
+        'black': black_name,
+        'red': red_name,
+        'winner': result.winner.name.lower() if result.winner is not None else 'draw',
+        'plies': result.plies,
+        'duration': round(duration, 4),
+        'nodes': getattr(black, 'total_nodes', 0) + getattr(red, 'total_nodes', 0),
+    }
+    playouts = getattr(black, 'total_playouts', 0) + getattr(red, 'total_playouts', 0)
+    if playouts:
+        record['playouts'] = playouts
+    if settings.eval_trace:
+        import evaluator
+        black_view = [position.with_turn(BLACK) for position in history]
+        record['eval_trace'] = evaluator.evaluate_positions(black_view).tolist()
+    if settings.record:
+        record['moves'] = records.encode_moves(recorder.moves).hex()
+    if profiling.enabled():
+        record['profile'] = profiling.summary()
+    return record
+
+
+def profile_path(profile_dir, index):
+    return os.path.join(profile_dir, 'game-{:05d}.prof'.format(index))
+
+
+def game_record(record):
+    moves = records.decode_moves(bytes.fromhex(record['moves']))
+    result = {'black': records.BLACK_WIN, 'red': records.RED_WIN, 'draw': records.DRAW}[record['winner']]
+    return records.GameRecord(moves, result, {'Black': record['black'], 'White': record['red']})
+
+
+# Player A is black in even-numbered games and red in odd-numbered ones when alternate is set
+def make_tasks(games, player_a, player_b, seed=0, settings=DEFAULT_SETTINGS, alternate=True):
+    for index in range(games):
+        black, red = player_a, player_b
+        if alternate and index % 2:
+            black, red = red, black
+        yield index, seed + index, black, red, settings
+
+
+# Yield the result of every game as it finishes, spreading the games over a pool of processes
+def run(tasks, processes=None):
+    with multiprocessing.Pool(processes) as pool:
+        for record in pool.imap_unordered(play_one, tasks):
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play a self-play tournament between two player types.')
+    parser.add_argument('player_a', choices=PLAYER_TYPES)
+    parser.add_argument('player_b', choices=PLAYER_TYPES)
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, default=0.1, help='seconds per move for search players')
+    parser.add_argument('--depth', type=int, default=search.MAX_PLY, help='maximum depth for search players')
+    parser.add_argument('--max-plies', type=int, default=headless.MAX_PLIES)
+    parser.add_argument('--no-alternate', action='store_true', help='always give player_a the black pieces')
+    parser.add_argument('--eval-trace', action='store_true',
+                        help='add the static evaluation of every position of each game (needs numpy)')
+    parser.add_argument('--tablebase', help='endgame tablebase file for search players')
+    parser.add_argument('--record', metavar='PATH', help='save every game to a binary game record file')
+    parser.add_argument('--book', help='opening book file for all players')
+    parser.add_argument('--book-plies', type=int, help='plies to play from the book (default: all the book has)')
+    parser.add_argument('--instrument', action='store_true',
+                        help='add call counts and times of the engine hot paths to each game')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='run each game under cProfile and save its stats, and all of them merged, in DIR')
+    args = parser.parse_args(argv)
+
+    book_plies = args.book_plies
+    if args.book and book_plies is None:
+        book_plies = _open_book(args.book).plies
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+    settings = Settings(args.time_limit, args.depth, args.max_plies, args.eval_trace, args.tablebase,
+                        args.record is not None, args.book, book_plies or 0, args.instrument, args.profile_dir)
+    writer = records.RecordWriter(args.record) if args.record else None
+    tasks = make_tasks(args.games, args.player_a, args.player_b, args.seed, settings, not args.no_alternate)
+    summary = {'black': 0, 'red': 0, 'draw': 0}
+    if args.player_a != args.player_b:
+        summary.update({args.player_a: 0, args.player_b: 0})
+    for record in run(tasks, args.processes):
+        if writer is not None:
+            writer.write(game_record(record))
+            del record['moves']
+        print(json.dumps(record), flush=True)
+        summary[record['winner']] += 1
+        if record['winner'] != 'draw' and args.player_a != args.player_b:
+            summary[record[record['winner']]] += 1
+    if writer is not None:
+        writer.close()
+    if args.profile_dir and args.games:
+        paths = [profile_path(args.profile_dir, index) for index in range(args.games)]
+        pstats.Stats(*paths).dump_stats(os.path.join(args.profile_dir, 'all.prof'))
+    print(json.dumps({'summary': summary}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
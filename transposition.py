@@ -0,0 +1,69 @@
+import array
+import collections
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Bytes per slot: key, move code, score, depth, bound and generation
+ENTRY_SIZE = 8 + 8 + 4 + 1 + 1 + 1
+DEFAULT_SIZE_MB = 16
+
+Entry = collections.namedtuple('Entry', ['depth', 'bound', 'score', 'move_code'])
+
+
+# A move as from-square | to-square << 5 | captured << 10, which tells apart every move of a position
+# short of two king jump loops over the same pieces.
+def move_code(move):
+    return move.path[0] | move.path[-1] << 5 | move.captured << 10
+
+
+def find_move(moves, code):
+    for move in moves:
+        if move.path[0] | move.path[-1] << 5 | move.captured << 10 == code:
+            return move
+    return None
+
+
+# A fixed-size transposition table kept in flat typed arrays, so its memory use is set once by
+# size_mb and never grows. Slots are indexed by the low bits of the Zobrist key. A slot is replaced
+# by a deeper (or equally deep) result, or by anything once the stored entry is from an older search.
+class TranspositionTable:
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        slots = 1
+        while slots * 2 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.size = slots
+        self.mask = slots - 1
+        self.generation = 0
+        self.keys = array.array('Q', bytes(8 * slots))
+        self.moves = array.array('Q', bytes(8 * slots))
+        self.scores = array.array('i', bytes(4 * slots))
+        self.depths = array.array('b', [-1]) * slots
+        self.bounds = array.array('B', bytes(slots))
+        self.generations = array.array('B', bytes(slots))
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.depths = array.array('b', [-1]) * self.size
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] != key or self.depths[index] < 0:
+            return None
+        return Entry(self.depths[index], self.bounds[index], self.scores[index], self.moves[index])
+
+    def store(self, key, depth, bound, score, code):
+        index = key & self.mask
+        if depth >= self.depths[index] or self.generations[index] != self.generation:
+            self.keys[index] = key
+            self.depths[index] = min(max(depth, 0), 127)
+            self.bounds[index] = bound
+            self.scores[index] = score
+            self.moves[index] = code
+            self.generations[index] = self.generation
+
+    def __len__(self):
+        return self.size
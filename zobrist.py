@@ -0,0 +1,53 @@
+import random
+
+# Zobrist keys for the four piece types on each of the 32 squares, and for red to move.
+# Keys are looked up a byte of a mask at a time: KEYS[piece][byte][bits] is the XOR of the keys
+# of every square set in that byte, so hashing any mask takes four lookups.
+BLACK_MAN = 0
+BLACK_KING = 1
+RED_MAN = 2
+RED_KING = 3
+
+_rng = random.Random(0x636865636b657273)
+SQUARE_KEYS = [[_rng.getrandbits(64) for _ in range(32)] for _ in range(4)]
+TURN_KEY = _rng.getrandbits(64)
+
+
+def _byte_table(square_keys):
+    table = [0] * 256
+    for bits in range(1, 256):
+        low = bits & -bits
+        table[bits] = table[bits ^ low] ^ square_keys[low.bit_length() - 1]
+    return table
+
+
+KEYS = [[_byte_table(SQUARE_KEYS[piece][byte * 8:byte * 8 + 8]) for byte in range(4)] for piece in range(4)]
+
+
+def mask_key(piece, mask):
+    table = KEYS[piece]
+    return table[0][mask & 0xFF] ^ table[1][mask >> 8 & 0xFF] ^ table[2][mask >> 16 & 0xFF] ^ table[3][mask >> 24]
+
+
+def full(black, red, kings, turn):
+    key = (mask_key(BLACK_MAN, black & ~kings) ^ mask_key(BLACK_KING, black & kings)
+           ^ mask_key(RED_MAN, red & ~kings) ^ mask_key(RED_KING, red & kings))
+    return key ^ TURN_KEY if turn else key
+
+
+# The change in key between two sets of masks, touching only the squares whose contents differ
+def delta(black, red, kings, new_black, new_red, new_kings):
+    key = 0
+    changed = (black & ~kings) ^ (new_black & ~new_kings)
+    if changed:
+        key ^= mask_key(BLACK_MAN, changed)
+    changed = (black & kings) ^ (new_black & new_kings)
+    if changed:
+        key ^= mask_key(BLACK_KING, changed)
+    changed = (red & ~kings) ^ (new_red & ~new_kings)
+    if changed:
+        key ^= mask_key(RED_MAN, changed)
+    changed = (red & kings) ^ (new_red & new_kings)
+    if changed:
+        key ^= mask_key(RED_KING, changed)
+    return key